@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'full_auth.settings')
+# each sync_to_async thread holds its own connection, so persistent ones
+# would pile up idle; set DB_CONN_MAX_AGE explicitly to keep them
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
+
+if getattr(settings, 'AUTH_PREWARM', False):
+    from users.prewarm import prewarm
+
+    prewarm()
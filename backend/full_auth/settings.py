@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -30,6 +31,8 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+INTERNAL_IPS = ["127.0.0.1"]
+
 
 # Application definition
 
@@ -52,6 +55,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'users.dispatch.ApiDispatchMiddleware',
+    'users.timing.ServerTimingMiddleware',
+    'users.renewal.AccessRenewalMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -62,6 +68,18 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Requests under AUTH_API_PREFIX skip the session, messages, CSRF, auth and
+# clickjacking middleware above and run through this chain instead (see
+# users.dispatch). None sends them down MIDDLEWARE like everything else.
+AUTH_API_PREFIX = '/api/'
+AUTH_API_MIDDLEWARE = [
+    'users.timing.ServerTimingMiddleware',
+    'users.renewal.AccessRenewalMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
 ROOT_URLCONF = 'full_auth.urls'
 
 TEMPLATES = [
@@ -85,13 +103,76 @@ WSGI_APPLICATION = 'full_auth.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Configured from the environment; without DB_ENGINE this is the local
+# db.sqlite3. DB_REPLICAS is a comma-separated list of replica hosts (or, for
+# SQLite, file names) that users.routers.AuthReplicaRouter reads auth
+# lookups from.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+DB_POOL = os.environ.get('DB_POOL', '') == '1'    # psycopg connection pool (PostgreSQL only)
+
+# Opt-in SQLite profile for single-node installs with concurrent writers
+# (DB_SQLITE_PROFILE=tuned): WAL journaling and friends on every connection,
+# IMMEDIATE transactions and an in-process writer queue.
+SQLITE_TUNED_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA busy_timeout=5000;'
+        'PRAGMA mmap_size=134217728;'       # 128 MiB
+        'PRAGMA cache_size=-32000;'         # 32 MiB
+        'PRAGMA temp_store=MEMORY'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 5,
+}
+
+if DB_ENGINE == 'django.db.backends.sqlite3' and os.environ.get('DB_SQLITE_PROFILE') == 'tuned':
+    DB_ENGINE = 'users.db_backends.sqlite3'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+        # persistent connections; must stay 0 when pooling, and full_auth.asgi
+        # defaults it to 0 since every async-to-sync thread keeps its own
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+if DB_ENGINE == 'users.db_backends.sqlite3':
+    DATABASES['default']['OPTIONS'].update(SQLITE_TUNED_OPTIONS)
+
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+    }
+
+DATABASE_REPLICAS = []
+
+for i, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(','))):
+    alias = f'replica_{i}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        # tests run replicas against the default test database
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DB_ENGINE in ('django.db.backends.sqlite3', 'users.db_backends.sqlite3'):
+        DATABASES[alias]['NAME'] = BASE_DIR / replica.strip()
+    else:
+        DATABASES[alias]['HOST'] = replica.strip()
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['users.routers.AuthReplicaRouter']
+AUTH_REPLICA_STICKY_SECONDS = 5     # reads stay on the primary this long after a write
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -111,6 +192,9 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+PASSWORD_HASHING_WORKERS = 2        # processes for password hashing, 0 runs it inline
+PASSWORD_HASHING_MAX_PENDING = 64   # queued + running operations before failing with 503
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -140,6 +224,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = "users.UserAccount"
 
+# ModelBackend with permission sets served from users.permission_cache
+AUTHENTICATION_BACKENDS = ["users.backends.CachedPermissionsBackend"]
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000"
 ]
@@ -156,6 +243,11 @@ REST_FRAMEWORK = {
         'users.authentication.CustomJWTAuthentication',
     ],
 
+    # only act on views with an auth throttle scope, see users.throttling
+    'DEFAULT_THROTTLE_CLASSES': [
+        'users.throttling.AuthIPThrottle',
+        'users.throttling.AuthEmailThrottle',
+    ],
 }
 
 # SIMPLE_JWT = {
@@ -206,7 +298,9 @@ DJOSER = {
     'USER_CREATE_PASSWORD_RETYPE': True,
     'PASSWORD_RESET_CONFIRM_RETYPE': True,
     'TOKEN_MODEL': None,
-    # 'SERIALIZERS': {},
+    'SERIALIZERS': {
+        'password_reset': 'users.serializers.CaseInsensitiveEmailResetSerializer',
+    },
 }
 
 AUTH_COOKIE_ACCESS_KEY = "access_token"
@@ -217,8 +311,72 @@ AUTH_COOKIE_PATH = "/"
 AUTH_COOKIE_SECURE = True
 AUTH_COOKIE_HTTP_ONLY = True
 AUTH_COOKIE_SAMESITE = "None"
-
-
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+AUTH_ACCESS_RENEWAL = False                 # reissue expiring access cookies from the refresh cookie
+AUTH_ACCESS_RENEW_WITHIN = 60               # seconds before expiry at which renewal kicks in
+AUTH_COOKIE_CSRF = True                     # unsafe requests authenticated by cookie need a trusted Origin or X-CSRFToken
+
+AUTH_TOKEN_CACHE_SIZE = 1024                # validated access tokens kept in memory, 0 disables
+AUTH_USER_CACHE_SIZE = 1024                 # user snapshots kept in memory, 0 disables
+AUTH_USER_CACHE_TTL = 60                    # seconds; without a shared tier, how long other workers may serve a user changed elsewhere
+AUTH_USER_CACHE_BACKEND = None              # optional shared tier, name of an entry in CACHES
+AUTH_PERMISSIONS_CLAIM = None               # e.g. "perms": embed each user's permission set in their access tokens
+
+AUTH_REVOCATION_CAPACITY = 100_000          # expected blacklisted tokens, sizes the Bloom filter
+AUTH_REVOCATION_ERROR_RATE = 0.01           # Bloom false-positive rate, hits fall back to the DB
+AUTH_REVOCATION_POLL_INTERVAL = 2           # seconds between polls for other workers' blacklist rows
+AUTH_REVOCATION_REBUILD_INTERVAL = 300      # seconds between full rebuilds
+
+AUTH_TOKEN_FAMILIES_CACHE = None            # name of an entry in CACHES; rotate refresh tokens as cached families
+AUTH_TOKEN_FAMILY_SNAPSHOT_INTERVAL = 30    # seconds between durable snapshots of family generations
+AUTH_TOKEN_EPOCHS_CACHE = None              # shared (non-LocMem) entry in CACHES; O(1) logout everywhere for one cache get per authentication
+AUTH_TOKEN_EPOCH_TTL = 300                  # seconds an epoch stays cached; a miss reads the user row
+
+AUTH_TOKEN_PRUNE_INTERVAL = None            # seconds between in-process prune passes, None leaves it to cron
+AUTH_TOKEN_PRUNE_BATCH_SIZE = 1000          # primary-key window per delete
+AUTH_TOKEN_PRUNE_TIME_BUDGET = 1.0          # seconds per in-process pass
+
+# "*_ip" rates key on REMOTE_ADDR; behind a reverse proxy, set
+# REST_FRAMEWORK["NUM_PROXIES"] to the number of proxies in front of the app
+# so the client address is read from X-Forwarded-For instead
+AUTH_THROTTLE_RATES = {
+    "login_ip": "30/min",
+    "login_email": "5/min",
+    "password_reset_ip": "10/hour",
+    "password_reset_email": "3/hour",
+}
+AUTH_THROTTLE_SHARDS = 16
+AUTH_THROTTLE_CACHE = None                  # optional shared mirror, name of an entry in CACHES
+
+AUTH_VERIFY_BATCH_MAX_TOKENS = 100          # tokens accepted by /api/jwt/verify/batch/
+AUTH_APPROVAL_EMAIL_BATCH_SIZE = 100        # confirmation emails per send_messages() on approval
+
+AUTH_AUDIT_SINK = None                      # "file" (NDJSON) or "db" (AuditEvent); None records nothing
+AUTH_AUDIT_FILE = BASE_DIR / "audit.ndjson"  # "{pid}" in the name gives each process its own file
+AUTH_AUDIT_FILE_MAX_BYTES = 10 * 1024 * 1024  # rotate past this size
+AUTH_AUDIT_FILE_BACKUPS = 5
+AUTH_AUDIT_BUFFER_SIZE = 10_000             # events waiting to be written, more are dropped and counted
+AUTH_AUDIT_BATCH_SIZE = 500                 # events per write, also flushes early once this many wait
+AUTH_AUDIT_FLUSH_INTERVAL = 1.0             # seconds
+
+AUTH_TIMING_ENABLED = False                 # phase histograms, served at /api/metrics/
+AUTH_SERVER_TIMING_HEADER = False           # add a Server-Timing header to responses
+
+AUTH_ASYNC_VIEWS = False                    # serve users.async_views under ASGI
+AUTH_LOGIN_RETURNS_USER = False             # include the /users/me/ payload in login responses
+AUTH_PREWARM = False                        # warm URLs, signing keys and hashers when the app loads
+
+
+# Mail is sent during the request through AUTH_MAIL_DELIVERY_BACKEND. With
+# AUTH_MAIL_QUEUE=1 it is queued in the database instead, so SMTP latency
+# stays out of requests; a `manage.py send_queued_mail --loop` worker must
+# then run alongside the app, or activation and reset mails are never sent.
+AUTH_MAIL_QUEUE = os.environ.get('AUTH_MAIL_QUEUE', '') == '1'
+AUTH_MAIL_DELIVERY_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+EMAIL_BACKEND = 'users.mail.QueuedEmailBackend' if AUTH_MAIL_QUEUE else AUTH_MAIL_DELIVERY_BACKEND
+AUTH_MAIL_BATCH_SIZE = 50                   # messages sent per connection
+AUTH_MAIL_MAX_ATTEMPTS = 5                  # then the message is marked failed
+AUTH_MAIL_RETRY_DELAY = 30                  # seconds before the first retry, doubled each time
+AUTH_MAIL_RETRY_MAX_DELAY = 3600
+AUTH_MAIL_LEASE = 300                       # seconds a claimed batch is hidden from other workers
 
 CSRF_COOKIE_SECURE = True
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+API-only settings profile, for workers that serve nothing but /api/:
+
+    DJANGO_SETTINGS_MODULE=full_auth.settings_api
+
+Everything in full_auth.settings except the admin, sessions, messages and
+staticfiles apps, with the short AUTH_API_MIDDLEWARE chain for every
+request. Responses are JSON only, djoser's views are imported on their
+first request (full_auth.urls_api), and the URL resolver, signing keys and
+password hashers are warmed up when the WSGI/ASGI application loads.
+
+The template engine stays: djoser renders its activation and password
+reset emails from templates.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import AUTH_API_MIDDLEWARE, INSTALLED_APPS, REST_FRAMEWORK, TEMPLATES
+
+
+API_EXCLUDED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_EXCLUDED_APPS]
+
+# every request takes the short API chain, so no dispatcher is needed
+MIDDLEWARE = list(AUTH_API_MIDDLEWARE)
+AUTH_API_MIDDLEWARE = None
+
+ROOT_URLCONF = 'full_auth.urls_api'
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+            ],
+        },
+    },
+]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    # the browsable API needs templates and static files
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+}
+
+AUTH_PREWARM = True
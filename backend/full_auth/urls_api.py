@@ -0,0 +1,54 @@
+"""
+URL configuration for the API-only profile (full_auth.settings_api).
+
+The same /api/ routes as full_auth.urls, without the admin. djoser's user
+routes are spelled out instead of built by its router, which would import
+djoser.views and everything behind it at startup; each view is imported
+on its first request instead.
+"""
+from django.contrib.auth import get_user_model
+from django.urls import include, path, re_path
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+
+
+def lazy_viewset(dotted_path, actions, **initkwargs):
+    view = None
+
+    @csrf_exempt
+    def dispatch(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path).as_view(dict(actions), **initkwargs)
+        return view(request, *args, **kwargs)
+
+    dispatch.actions = actions
+    return dispatch
+
+
+def user_route(route, actions, detail=False):
+    view = lazy_viewset("djoser.views.UserViewSet", actions, basename="user", detail=detail)
+    return re_path(rf"^api/users/{route}$", view)
+
+
+USERNAME_FIELD = get_user_model().USERNAME_FIELD
+
+# in djoser's router order: the detail route must come after the named ones
+urlpatterns = [
+    user_route("", {"get": "list", "post": "create"}),
+    user_route("activation/", {"post": "activation"}),
+    user_route("me/", {"get": "me", "put": "me", "patch": "me", "delete": "me"}),
+    user_route("resend_activation/", {"post": "resend_activation"}),
+    user_route("reset_password/", {"post": "reset_password"}),
+    user_route("reset_password_confirm/", {"post": "reset_password_confirm"}),
+    user_route(f"reset_{USERNAME_FIELD}/", {"post": "reset_username"}),
+    user_route(f"reset_{USERNAME_FIELD}_confirm/", {"post": "reset_username_confirm"}),
+    user_route("set_password/", {"post": "set_password"}),
+    user_route(f"set_{USERNAME_FIELD}/", {"post": "set_username"}),
+    user_route(
+        r"(?P<id>[^/.]+)/",
+        {"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"},
+        detail=True,
+    ),
+    path('api/', include('users.urls')),
+]
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'full_auth.settings')
 
 application = get_wsgi_application()
+
+if getattr(settings, 'AUTH_PREWARM', False):
+    from users.prewarm import prewarm
+
+    prewarm()
@@ -1,3 +1,23 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils.translation import ngettext
 
-# Register your models here.
+from .approval import approve_users
+from .models import UserAccount
+
+
+@admin.register(UserAccount)
+class UserAccountAdmin(admin.ModelAdmin):
+    list_display = ("email", "first_name", "last_name", "is_active", "is_staff")
+    list_filter = ("is_active", "is_staff")
+    search_fields = ("email", "first_name", "last_name")
+    exclude = ("password",)
+    actions = ["approve"]
+
+    @admin.action(description="Approve selected users")
+    def approve(self, request, queryset):
+        approved = approve_users(queryset, request)
+        self.message_user(
+            request,
+            ngettext("%d user approved.", "%d users approved.", approved) % approved,
+            messages.SUCCESS,
+        )
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from djoser.conf import settings as djoser_settings
+
+from .permission_cache import permission_cache
+from .routers import pin_primary
+from .user_cache import user_cache
+
+
+def approve_users(queryset, request=None):
+    """
+    Activates the inactive users in queryset with a single UPDATE and, once
+    the transaction commits, sends each of them djoser's confirmation email.
+    Returns the number of users approved.
+    """
+    with transaction.atomic():
+        users = list(
+            queryset.filter(is_active=False)
+            .select_for_update()
+            .only("pk", "email", "first_name", "last_name")
+        )
+        if not users:
+            return 0
+
+        queryset.model.objects.filter(
+            pk__in=[user.pk for user in users], is_active=False,
+        ).update(is_active=True)
+
+        # update() skips post_save, so do what users.signals would
+        for user in users:
+            user.is_active = True
+            user_cache.invalidate(user.pk)
+            permission_cache.invalidate(user.pk)
+            pin_primary(f"user:{user.pk}")
+
+        transaction.on_commit(lambda: send_approval_emails(users, request))
+
+    return len(users)
+
+
+def send_approval_emails(users, request=None, batch_size=None):
+    """
+    Renders djoser's confirmation email for each user and sends them over one
+    mail connection, batch_size messages per send_messages() call.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, "AUTH_APPROVAL_EMAIL_BATCH_SIZE", 100)
+
+    email_class = djoser_settings.EMAIL.confirmation
+    sent = 0
+
+    with get_connection() as connection:
+        for start in range(0, len(users), batch_size):
+            messages = []
+            for user in users[start:start + batch_size]:
+                message = email_class(request, {"user": user})
+                message.render()
+                message.request = None
+                message.to = [user.email]
+                message.from_email = settings.DEFAULT_FROM_EMAIL
+                messages.append(message)
+
+            sent += connection.send_messages(messages) or 0
+
+    return sent
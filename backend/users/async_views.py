@@ -0,0 +1,273 @@
+"""
+Async variants of the views in users.views, for the ASGI entry point.
+
+They are plain Django class-based views with async handlers (DRF views are
+sync-only), use the async ORM throughout and mirror the request/response
+format of their DRF counterparts. Enable them with AUTH_ASYNC_VIEWS = True.
+"""
+
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aauthenticate, get_user_model
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import classonlymethod
+from django.utils.translation import gettext_lazy as _
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied, Throttled
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+
+from .audit import audit_log, record_response
+from .authentication import CustomJWTAuthentication
+from .epochs import revoke_all, token_epochs
+from .families import FAMILY_CLAIM, arevoke_family_of, token_families
+from .hashing import HashingUnavailable
+from .revocation import revocation_index
+from .serializers import current_user_data
+from .throttling import check_login_throttles
+from .token_cache import token_cache
+from .tokens import AsyncRefreshToken
+from .views import set_cookie_internal, set_csrf_cookie
+
+
+def error_response(detail, code, status_code=status.HTTP_401_UNAUTHORIZED):
+    return JsonResponse({"detail": str(detail), "code": code}, status=status_code)
+
+
+class AsyncAPIView(View):
+    http_method_names = ["post", "options"]
+    audit_event = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # authentication is cookie/JWT based, same as the DRF views
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        # handlers fill in user_id / identifier for the audit event
+        self.audit_fields = {}
+        response = await super().dispatch(request, *args, **kwargs)
+
+        if self.audit_event is not None and audit_log.enabled:
+            record_response(self.audit_event, request, response, **self.audit_fields)
+
+        return response
+
+    def get_data(self, request):
+        if request.content_type == "application/json":
+            try:
+                return json.loads(request.body or b"{}")
+            except ValueError:
+                return None
+
+        return request.POST.dict()
+
+    def required_fields(self, data, *fields):
+        """
+        Returns a DRF-style 400 response if any of the fields is missing.
+        """
+        if data is None:
+            return error_response(_("JSON parse error"), "parse_error", status.HTTP_400_BAD_REQUEST)
+
+        errors = {
+            field: [str(_("This field is required."))]
+            for field in fields if not data.get(field)
+        }
+
+        if errors:
+            return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        return None
+
+
+class AsyncCustomTokenObtainPairView(AsyncAPIView):
+    audit_event = "login"
+
+    async def post(self, request, *args, **kwargs):
+        username_field = get_user_model().USERNAME_FIELD
+        data = self.get_data(request)
+
+        if response := self.required_fields(data, username_field, "password"):
+            return response
+
+        self.audit_fields["identifier"] = data[username_field]
+
+        try:
+            check_login_throttles(request, data)
+        except Throttled as e:
+            response = error_response(e.detail, e.default_code, e.status_code)
+            response["Retry-After"] = str(math.ceil(e.wait))
+            return response
+
+        try:
+            user = await aauthenticate(
+                request,
+                **{username_field: data[username_field], "password": data["password"]},
+            )
+        except HashingUnavailable as e:
+            return error_response(e.detail, e.default_code, e.status_code)
+
+        self.audit_fields["user_id"] = getattr(user, "pk", None)
+
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            return error_response(
+                _("No active account found with the given credentials"),
+                "no_active_account",
+            )
+
+        refresh = await AsyncRefreshToken.afor_user(user)
+        data = {"refresh": str(refresh), "access": str(await refresh.aaccess_token())}
+
+        if api_settings.UPDATE_LAST_LOGIN:
+            user.last_login = refresh.current_time
+            await user.asave(update_fields=["last_login"])
+
+        if getattr(settings, "AUTH_LOGIN_RETURNS_USER", False):
+            data["user"] = current_user_data(user, {"request": request})
+
+        response = JsonResponse(data)
+        response = set_cookie_internal(response, settings.AUTH_COOKIE_ACCESS_KEY, data)
+        response = set_cookie_internal(response, settings.AUTH_COOKIE_REFRESH_KEY, data)
+        response = set_csrf_cookie(request, response)
+
+        return response
+
+
+class AsyncCustomTokenRefreshView(AsyncAPIView):
+    audit_event = "refresh"
+
+    async def post(self, request, *args, **kwargs):
+        data = self.get_data(request)
+        refresh_token = request.COOKIES.get(settings.AUTH_COOKIE_REFRESH_KEY)
+
+        if refresh_token and data is not None:
+            data["refresh"] = refresh_token
+
+        if response := self.required_fields(data, "refresh"):
+            return response
+
+        try:
+            refresh = AsyncRefreshToken(data["refresh"])
+            self.audit_fields["user_id"] = refresh.get(api_settings.USER_ID_CLAIM)
+            await refresh.acheck_blacklist()
+            await token_epochs.acheck(refresh)
+        except TokenError as e:
+            return error_response(e.args[0], "token_not_valid")
+
+        # deleted users are turned away like inactive ones
+        user = await refresh.aget_user()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            return error_response(
+                _("No active account found for the given token."),
+                "no_active_account",
+            )
+
+        if token_families.enabled and FAMILY_CLAIM in refresh:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            try:
+                await token_families.arotate(refresh)
+            except TokenError as e:
+                return error_response(e.args[0], "token_not_valid")
+
+            data = {"access": str(await refresh.aaccess_token()), "refresh": str(refresh)}
+        else:
+            data = {"access": str(await refresh.aaccess_token())}
+
+            if api_settings.ROTATE_REFRESH_TOKENS:
+                if api_settings.BLACKLIST_AFTER_ROTATION:
+                    await refresh.ablacklist()
+
+                refresh.set_jti()
+                refresh.set_exp()
+                refresh.set_iat()
+                await refresh.aoutstand()
+
+                data["refresh"] = str(refresh)
+
+        response = JsonResponse(data)
+        response = set_cookie_internal(response, settings.AUTH_COOKIE_ACCESS_KEY, data)
+        response = set_cookie_internal(response, settings.AUTH_COOKIE_REFRESH_KEY, data)
+
+        return response
+
+
+class AsyncCustomTokenVerifyView(AsyncAPIView):
+    async def post(self, request, *args, **kwargs):
+        data = self.get_data(request)
+        access_token = request.COOKIES.get(settings.AUTH_COOKIE_REFRESH_KEY)
+
+        if access_token and data is not None:
+            data["token"] = access_token
+
+        if response := self.required_fields(data, "token"):
+            return response
+
+        try:
+            token = UntypedToken(data["token"])
+        except TokenError as e:
+            return error_response(e.args[0], "token_not_valid")
+
+        if not (await token_epochs.ais_current(token) and await token_families.ais_current(token)):
+            return JsonResponse(
+                {"non_field_errors": [str(_("Token has been revoked"))]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if api_settings.BLACKLIST_AFTER_ROTATION:
+            if await revocation_index.ais_revoked(token.get(api_settings.JTI_CLAIM)):
+                return JsonResponse(
+                    {"non_field_errors": [str(_("Token is blacklisted"))]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        return JsonResponse({})
+
+
+class AsyncLogoutView(AsyncAPIView):
+    audit_event = "logout"
+
+    async def post(self, request, *args, **kwargs):
+        access_token = request.COOKIES.get(settings.AUTH_COOKIE_ACCESS_KEY)
+        if access_token:
+            token_cache.discard(access_token)
+
+        await arevoke_family_of(request.COOKIES.get(settings.AUTH_COOKIE_REFRESH_KEY))
+
+        response = HttpResponse(status=status.HTTP_204_NO_CONTENT)
+        response.delete_cookie(settings.AUTH_COOKIE_ACCESS_KEY)
+        response.delete_cookie(settings.AUTH_COOKIE_REFRESH_KEY)
+
+        return response
+
+
+class AsyncLogoutAllView(AsyncLogoutView):
+    audit_event = "logout_all"
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            authenticated = await CustomJWTAuthentication().aauthenticate(request)
+        except PermissionDenied as e:
+            return error_response(e.detail, e.default_code, e.status_code)
+
+        if authenticated is None:
+            return error_response(
+                _("Authentication credentials were not provided."),
+                "not_authenticated",
+            )
+
+        user, _token = authenticated
+        self.audit_fields["user_id"] = user.pk
+        if token_epochs.enabled:
+            await token_epochs.abump(user.pk)
+        else:
+            await sync_to_async(revoke_all)(user.pk)
+
+        return await super().post(request, *args, **kwargs)
@@ -0,0 +1,238 @@
+"""
+Non-blocking audit trail of authentication events (AUTH_AUDIT_SINK).
+
+The login, refresh and logout views and CustomJWTAuthentication call
+record(), which appends the event to an in-memory buffer and returns. A
+background thread in each process flushes the buffer every
+AUTH_AUDIT_FLUSH_INTERVAL seconds, or as soon as AUTH_AUDIT_BATCH_SIZE
+events are waiting, to the sink:
+
+    "file"  NDJSON appended to AUTH_AUDIT_FILE, one write per batch, rotated
+            at AUTH_AUDIT_FILE_MAX_BYTES keeping AUTH_AUDIT_FILE_BACKUPS
+            old files. "{pid}" in the name gives each process its own file.
+    "db"    AuditEvent rows, one bulk_create per batch.
+
+If the sink falls behind and AUTH_AUDIT_BUFFER_SIZE events are waiting,
+new events are dropped and counted rather than making requests wait.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+from .models import AuditEvent
+
+
+logger = logging.getLogger(__name__)
+
+_client = BaseThrottle()
+
+
+class FileSink:
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5):
+        self.path = str(path).format(pid=os.getpid())
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, events):
+        data = "".join(json.dumps(event, cls=DjangoJSONEncoder) + "\n" for event in events).encode()
+
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+
+        if self.max_bytes and size and size + len(data) > self.max_bytes:
+            self.rotate()
+
+        # O_APPEND: concurrent writers never overwrite each other's batches
+        with open(self.path, "ab") as f:
+            f.write(data)
+
+
+class DatabaseSink:
+    def write(self, events):
+        try:
+            AuditEvent.objects.bulk_create([AuditEvent(**event) for event in events])
+        finally:
+            # this thread never sees request_finished
+            close_old_connections()
+
+
+def get_sink(name):
+    if name == "file":
+        return FileSink(
+            getattr(settings, "AUTH_AUDIT_FILE", settings.BASE_DIR / "audit.ndjson"),
+            max_bytes=getattr(settings, "AUTH_AUDIT_FILE_MAX_BYTES", 10 * 1024 * 1024),
+            backups=getattr(settings, "AUTH_AUDIT_FILE_BACKUPS", 5),
+        )
+    if name == "db":
+        return DatabaseSink()
+    raise ValueError(f"Unknown AUTH_AUDIT_SINK {name!r}")
+
+
+class AuditLog:
+    def __init__(self, sink=None, capacity=10_000, batch_size=500, flush_interval=1.0):
+        self.sink_name = sink
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._events = deque()
+        self._sink = None
+        self._thread = None
+        self._pid = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sink_name is not None
+
+    def _start(self):
+        # per process: a forked worker inherits neither the thread nor,
+        # with "{pid}" in AUTH_AUDIT_FILE, the file
+        self._pid = os.getpid()
+        self._sink = get_sink(self.sink_name)
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def add(self, event):
+        """
+        Buffers event for the writer thread; never blocks on the sink.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+
+            if len(self._events) >= self.capacity:
+                self.dropped += 1
+                return
+
+            self._events.append(event)
+            self.recorded += 1
+            waiting = len(self._events)
+
+        if waiting >= self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Writes everything buffered so far. Returns the number of events written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, deque()
+
+            if not events or self._sink is None:
+                return 0
+
+            written = 0
+            events = list(events)
+            for start in range(0, len(events), self.batch_size):
+                batch = events[start:start + self.batch_size]
+                try:
+                    self._sink.write(batch)
+                except Exception as e:
+                    logger.warning("Could not write %d audit events: %s", len(batch), e)
+                    self.failed += len(batch)
+                else:
+                    written += len(batch)
+
+            self.written += written
+            return written
+
+    def stats(self):
+        return {
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "buffered": len(self._events),
+        }
+
+
+audit_log = AuditLog(
+    sink=getattr(settings, "AUTH_AUDIT_SINK", None),
+    capacity=getattr(settings, "AUTH_AUDIT_BUFFER_SIZE", 10_000),
+    batch_size=getattr(settings, "AUTH_AUDIT_BATCH_SIZE", 500),
+    flush_interval=getattr(settings, "AUTH_AUDIT_FLUSH_INTERVAL", 1.0),
+)
+
+
+def record(event, request, outcome="success", status=None, code="", user_id=None, identifier=""):
+    if not audit_log.enabled:
+        return
+
+    audit_log.add({
+        "created_at": timezone.now(),
+        "event": event,
+        "outcome": outcome,
+        "status": status,
+        "code": str(code or "")[:64],
+        "user_id": user_id,
+        "identifier": str(identifier or "")[:255],
+        "ip": _client.get_ident(request) or "",
+        "user_agent": request.META.get("HTTP_USER_AGENT", "")[:255],
+    })
+
+
+def failure_code(response):
+    if hasattr(response, "data"):
+        # DRF response, not rendered yet
+        data = response.data
+    else:
+        try:
+            data = json.loads(response.content)
+        except ValueError:
+            return ""
+
+    if not isinstance(data, dict):
+        return ""
+
+    return data.get("code") or getattr(data.get("detail"), "code", "")
+
+
+def record_response(event, request, response, user_id=None, identifier=""):
+    if not audit_log.enabled:
+        return
+
+    failed = response.status_code >= 400
+    record(
+        event, request,
+        outcome="failure" if failed else "success",
+        status=response.status_code,
+        code=failure_code(response) if failed else "",
+        user_id=user_id,
+        identifier=identifier,
+    )
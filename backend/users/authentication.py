@@ -1,8 +1,34 @@
 from django.conf import settings
+from django.core.exceptions import DisallowedHost
+from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
 from rest_framework.authentication import CSRFCheck
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework import exceptions
 
+from .audit import record
+from .epochs import token_epochs
+from .permission_cache import permission_cache
+from .renewal import arenew_access, needs_renewal, renew_access, renewal_enabled
+from .routers import replica_reads
+from .timing import phase
+from .token_cache import token_cache
+from .user_cache import user_cache
+
+
+def record_failure(request, exc):
+    if isinstance(exc, exceptions.APIException):
+        code = exc.get_codes()
+        if isinstance(code, dict):
+            code = code.get("code", exc.default_code)
+    else:
+        code = type(exc).__name__
+
+    record("authenticate", request, outcome="failure", code=code)
+
 
 class CustomJWTAuthentication(JWTAuthentication):
     def enforce_csrf(self, request):
@@ -17,22 +43,216 @@ class CustomJWTAuthentication(JWTAuthentication):
             raise exceptions.PermissionDenied('CSRF Failed: %s'%reason)
         
     
-    def authenticate(self, request):
+    def get_validated_token(self, raw_token):
+        validated_token = token_cache.get(raw_token)
+
+        if validated_token is None:
+            # PyJWT decodes and checks the signature in a single call
+            with phase("auth_token_decode"):
+                validated_token = super().get_validated_token(raw_token)
+            token_cache.set(raw_token, validated_token)
+
+        return validated_token
+
+    def get_user_id(self, validated_token):
         try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+    def check_epoch(self, validated_token):
+        if not token_epochs.is_current(validated_token):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+    async def acheck_epoch(self, validated_token):
+        if not await token_epochs.ais_current(validated_token):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+    def check_user(self, user, validated_token):
+        """
+        Same checks as JWTAuthentication.get_user, for users that did not come
+        from its query.
+        """
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+    def prime_permissions(self, user, validated_token):
+        """
+        Seeds the user's permission set from the token's permissions claim
+        (AUTH_PERMISSIONS_CLAIM), unless it changed after the token was issued.
+        """
+        claim = getattr(settings, "AUTH_PERMISSIONS_CLAIM", None)
+        perms = validated_token.get(claim) if claim else None
+
+        if perms is not None and permission_cache.is_fresh(user.pk, validated_token.get("iat", 0)):
+            user._perm_cache = frozenset(perms)
+
+        return user
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+
+        with phase("auth_user"):
+            user = user_cache.get(user_id)
+
+            if user is None:
+                with replica_reads(f"user:{user_id}"):
+                    user = super().get_user(validated_token)
+                user_cache.set(user_id, user)
+            else:
+                self.check_user(user, validated_token)
+
+            return self.prime_permissions(user, validated_token)
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+
+        with phase("auth_user"):
+            user = user_cache.get(user_id)
+
+            if user is None:
+                try:
+                    with replica_reads(f"user:{user_id}"):
+                        user = await self.user_model.objects.aget(
+                            **{api_settings.USER_ID_FIELD: user_id}
+                        )
+                except self.user_model.DoesNotExist as e:
+                    raise AuthenticationFailed(
+                        _("User not found"), code="user_not_found"
+                    ) from e
+
+                self.check_user(user, validated_token)
+                user_cache.set(user_id, user)
+            else:
+                self.check_user(user, validated_token)
+
+            return self.prime_permissions(user, validated_token)
+
+    def get_request_token(self, request):
+        with phase("auth_cookie"):
             header = self.get_header(request)
 
             if header is None:
-                raw_token = request.COOKIES.get(settings.AUTH_COOKIE_ACCESS_KEY)
-            else:
-                raw_token = self.get_raw_token(header)
+                return request.COOKIES.get(settings.AUTH_COOKIE_ACCESS_KEY)
 
-            if raw_token is None:
-                return None
+            return self.get_raw_token(header)
 
-            validated_token = self.get_validated_token(raw_token)
-            # self.enforce_csrf(request)
+    def trusted_origin(self, request):
+        """
+        True if the browser says the request comes from this site or from
+        one of CORS_ALLOWED_ORIGINS; pages on other sites cannot forge Origin.
+        """
+        origin = request.META.get("HTTP_ORIGIN")
+        if not origin:
+            return False
 
-            return self.get_user(validated_token), validated_token
-        
-        except:
-            return None
\ No newline at end of file
+        if origin in getattr(settings, "CORS_ALLOWED_ORIGINS", ()):
+            return True
+
+        try:
+            return origin == f"{request.scheme}://{request.get_host()}"
+        except DisallowedHost:
+            return False
+
+    def check_csrf(self, request):
+        """
+        CSRF check for cookie sessions, done here once instead of in
+        CsrfViewMiddleware, which API views are exempt from. Unsafe requests
+        from a trusted Origin pass; any other needs the X-CSRFToken header.
+        A forged cross-site request cannot set the Authorization header, so
+        header tokens are not checked. AUTH_COOKIE_CSRF = False opts out.
+        """
+        if not getattr(settings, "AUTH_COOKIE_CSRF", True) or self.get_header(request) is not None:
+            return
+
+        if request.method in SAFE_METHODS or self.trusted_origin(request):
+            return
+
+        self.enforce_csrf(request)
+
+    def can_renew(self, request):
+        # only cookie sessions are renewed; header clients refresh themselves
+        return renewal_enabled() and self.get_header(request) is None
+
+    def authenticate(self, request):
+        raw_token = None
+
+        try:
+            raw_token = self.get_request_token(request)
+            renew = self.can_renew(request)
+
+            try:
+                validated_token = None if raw_token is None else self.get_validated_token(raw_token)
+            except InvalidToken:
+                if not renew:
+                    raise
+                validated_token = None
+
+            if validated_token is None:
+                # missing or expired access cookie: fall back to the refresh cookie
+                validated_token = renew_access(request) if renew else None
+                if validated_token is None:
+                    return None
+            elif renew and needs_renewal(validated_token):
+                renew_access(request)
+
+            self.check_epoch(validated_token)
+            user = self.get_user(validated_token)
+
+        except Exception as e:
+            if raw_token is not None:
+                record_failure(request, e)
+            return None
+
+        self.check_csrf(request)
+
+        return user, validated_token
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of authenticate() for async views; the user lookup
+        goes through the async ORM instead of a thread hop.
+        """
+        raw_token = None
+
+        try:
+            raw_token = self.get_request_token(request)
+            renew = self.can_renew(request)
+
+            try:
+                validated_token = None if raw_token is None else self.get_validated_token(raw_token)
+            except InvalidToken:
+                if not renew:
+                    raise
+                validated_token = None
+
+            if validated_token is None:
+                validated_token = await arenew_access(request) if renew else None
+                if validated_token is None:
+                    return None
+            elif renew and needs_renewal(validated_token):
+                await arenew_access(request)
+
+            await self.acheck_epoch(validated_token)
+            user = await self.aget_user(validated_token)
+
+        except Exception as e:
+            if raw_token is not None:
+                record_failure(request, e)
+            return None
+
+        self.check_csrf(request)
+
+        return user, validated_token
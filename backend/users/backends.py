@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from . import hashing
+from .permission_cache import permission_cache
+
+
+class CachedPermissionsBackend(ModelBackend):
+    """
+    ModelBackend whose per-user permission set comes from permission_cache,
+    so has_perm() only joins through groups and user_permissions on a miss
+    rather than once per request.
+    """
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """
+        ModelBackend.aauthenticate, with the dummy hash for unknown users
+        awaited on the hashing pool instead of blocking the event loop.
+        """
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # same work as for a wrong password, so timings don't reveal users
+            await hashing.amake_password(password)
+            return None
+
+        if await user.acheck_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        if not hasattr(user_obj, "_perm_cache"):
+            perms = permission_cache.get(user_obj.pk)
+            if perms is None:
+                perms = frozenset(super().get_all_permissions(user_obj))
+                permission_cache.set(user_obj.pk, perms)
+            user_obj._perm_cache = perms
+
+        return user_obj._perm_cache
+
+    async def aget_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        if not hasattr(user_obj, "_perm_cache"):
+            perms = permission_cache.get(user_obj.pk)
+            if perms is None:
+                perms = frozenset(await super().aget_all_permissions(user_obj))
+                permission_cache.set(user_obj.pk, perms)
+            user_obj._perm_cache = perms
+
+        return user_obj._perm_cache
@@ -0,0 +1,98 @@
+"""
+SQLite backend for single-node deployments with concurrent writers.
+
+SQLite allows one writer at a time. Threads of the same process that race
+for the write lock fail with "database is locked" when a deferred
+transaction tries to upgrade from reading to writing. This backend queues
+writers of one process on a per-database lock instead: explicit
+transactions take it at BEGIN (with OPTIONS["transaction_mode"] =
+"IMMEDIATE"), single autocommit writes around the statement. Writers from
+other processes are left to busy_timeout.
+
+The pragmas that go with it (WAL, synchronous=NORMAL, ...) are set through
+OPTIONS["init_command"]; see SQLITE_TUNED_OPTIONS in settings.
+"""
+
+import threading
+
+from django.db.backends.sqlite3 import base
+
+
+_write_locks = {}
+_write_locks_lock = threading.Lock()
+
+
+def get_write_lock(name):
+    with _write_locks_lock:
+        return _write_locks.setdefault(str(name), threading.Lock())
+
+
+def is_read(query):
+    return query.lstrip()[:6].upper() in ("SELECT", "PRAGMA")
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    db = None
+
+    def _locked(self, method, query, *args):
+        # inside a transaction the lock was taken at BEGIN
+        db = self.db
+        if db is None or db.write_lock is None or db.holds_write_lock or is_read(query):
+            return method(query, *args)
+
+        with db.write_lock:
+            return method(query, *args)
+
+    def execute(self, query, params=None):
+        return self._locked(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._locked(super().executemany, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.write_lock = None if self.is_in_memory_db() else get_write_lock(self.settings_dict["NAME"])
+        self.holds_write_lock = False
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.db = self
+        return cursor
+
+    def _acquire_write_lock(self):
+        if self.write_lock is not None and not self.holds_write_lock:
+            self.write_lock.acquire()
+            self.holds_write_lock = True
+
+    def _release_write_lock(self):
+        if self.holds_write_lock:
+            self.holds_write_lock = False
+            self.write_lock.release()
+
+    def _start_transaction_under_autocommit(self):
+        self._acquire_write_lock()
+        try:
+            super()._start_transaction_under_autocommit()
+        except Exception:
+            self._release_write_lock()
+            raise
+
+    def _commit(self):
+        try:
+            super()._commit()
+        finally:
+            self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            self._release_write_lock()
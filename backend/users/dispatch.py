@@ -0,0 +1,112 @@
+"""
+Short middleware chain for API requests (AUTH_API_MIDDLEWARE).
+
+Requests under AUTH_API_PREFIX authenticate with the JWT cookies in
+CustomJWTAuthentication, which also performs the CSRF check, so sessions,
+messages, CsrfViewMiddleware, AuthenticationMiddleware and X-Frame-Options
+only cost them time. ApiDispatchMiddleware, first in MIDDLEWARE, hands
+those requests to a second handler built from AUTH_API_MIDDLEWARE; all
+other paths (the admin) continue down the full chain.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+
+class MiddlewareChain(BaseHandler):
+    """
+    BaseHandler over an explicit middleware list instead of
+    settings.MIDDLEWARE; load_middleware() mirrors Django's.
+    """
+
+    def __init__(self, middleware):
+        self.middleware = middleware
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        handler_is_async = is_async
+
+        for middleware_path in reversed(self.middleware):
+            middleware = import_string(middleware_path)
+            middleware_can_sync = getattr(middleware, "sync_capable", True)
+            middleware_can_async = getattr(middleware, "async_capable", False)
+
+            if not handler_is_async and middleware_can_sync:
+                middleware_is_async = False
+            else:
+                middleware_is_async = middleware_can_async
+
+            try:
+                adapted_handler = self.adapt_method_mode(
+                    middleware_is_async, handler, handler_is_async,
+                    debug=settings.DEBUG, name=f"middleware {middleware_path}",
+                )
+                mw_instance = middleware(adapted_handler)
+            except MiddlewareNotUsed:
+                continue
+
+            if mw_instance is None:
+                raise ImproperlyConfigured(f"Middleware factory {middleware_path} returned None.")
+
+            if hasattr(mw_instance, "process_view"):
+                self._view_middleware.insert(0, self.adapt_method_mode(is_async, mw_instance.process_view))
+            if hasattr(mw_instance, "process_template_response"):
+                self._template_response_middleware.append(
+                    self.adapt_method_mode(is_async, mw_instance.process_template_response),
+                )
+            if hasattr(mw_instance, "process_exception"):
+                self._exception_middleware.append(self.adapt_method_mode(False, mw_instance.process_exception))
+
+            handler = convert_exception_to_response(mw_instance)
+            handler_is_async = middleware_is_async
+
+        self._middleware_chain = self.adapt_method_mode(is_async, handler, handler_is_async)
+
+
+class ApiDispatchMiddleware:
+    """
+    Routes API requests through the AUTH_API_MIDDLEWARE chain. Must come
+    first in MIDDLEWARE; removed from the chain if AUTH_API_MIDDLEWARE is None.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        middleware = getattr(settings, "AUTH_API_MIDDLEWARE", None)
+        if middleware is None:
+            raise MiddlewareNotUsed()
+
+        self.prefix = getattr(settings, "AUTH_API_PREFIX", "/api/")
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+
+        self.api = MiddlewareChain(middleware)
+        self.api.load_middleware(is_async=self.async_mode)
+
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        if request.path_info.startswith(self.prefix):
+            return self.api._middleware_chain(request)
+
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path_info.startswith(self.prefix):
+            return await self.api._middleware_chain(request)
+
+        return await self.get_response(request)
@@ -0,0 +1,198 @@
+"""
+Per-user token epochs, for logging a user out everywhere (AUTH_TOKEN_EPOCHS_CACHE).
+
+Every token carries the epoch ("epc") its user had when it was issued.
+/api/logout/all/ increments UserAccount.token_epoch, and
+CustomJWTAuthentication, the refresh views and the verify views reject
+tokens from an older epoch, so revoking all of a user's tokens is one
+UPDATE rather than a BlacklistedToken row per outstanding token.
+
+The current epochs are cached in the named cache backend for
+AUTH_TOKEN_EPOCH_TTL seconds, so a check costs every authenticated request
+one cache lookup, and a miss reads the user row. A bump writes the row,
+then the cache, which must be shared (Redis, Memcached) for every worker
+to see it: a LocMem alias fails the users.E001 system check. Tokens issued
+before epochs were enabled count as epoch 0.
+
+Epochs are off unless AUTH_TOKEN_EPOCHS_CACHE is set; /api/logout/all/
+then falls back to revoke_all(), which blacklists the user's outstanding
+refresh tokens and revokes their token families one by one.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .models import TokenFamily
+
+
+EPOCH_CLAIM = "epc"
+
+
+class TokenEpochStore:
+    def __init__(self, alias=None, timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+        self.checks = 0
+        self.misses = 0
+        self.rejections = 0
+        self.bumps = 0
+
+    @property
+    def enabled(self):
+        return self.alias is not None
+
+    def _cache(self):
+        return caches[self.alias]
+
+    def _key(self, user_id):
+        return f"auth:epoch:{user_id}"
+
+    def _users(self, user_id):
+        return get_user_model()._default_manager.filter(**{api_settings.USER_ID_FIELD: user_id})
+
+    def current(self, user_id):
+        self.checks += 1
+        epoch = self._cache().get(self._key(user_id))
+
+        if epoch is None:
+            self.misses += 1
+            epoch = self._users(user_id).values_list("token_epoch", flat=True).first() or 0
+            self._cache().add(self._key(user_id), epoch, self.timeout)
+
+        return epoch
+
+    async def acurrent(self, user_id):
+        self.checks += 1
+        epoch = await self._cache().aget(self._key(user_id))
+
+        if epoch is None:
+            self.misses += 1
+            epoch = await self._users(user_id).values_list("token_epoch", flat=True).afirst() or 0
+            await self._cache().aadd(self._key(user_id), epoch, self.timeout)
+
+        return epoch
+
+    def stamp(self, token, user):
+        """
+        Embeds user's epoch; user is the row just loaded to issue token.
+        """
+        if self.enabled:
+            token[EPOCH_CLAIM] = user.token_epoch
+
+    def _stale(self, token, epoch):
+        if token.get(EPOCH_CLAIM, 0) < epoch:
+            self.rejections += 1
+            return True
+        return False
+
+    def is_current(self, token):
+        if not self.enabled:
+            return True
+        return not self._stale(token, self.current(token.get(api_settings.USER_ID_CLAIM)))
+
+    async def ais_current(self, token):
+        if not self.enabled:
+            return True
+        return not self._stale(token, await self.acurrent(token.get(api_settings.USER_ID_CLAIM)))
+
+    def check(self, token):
+        if not self.is_current(token):
+            raise TokenError(_("Token has been revoked"))
+
+    async def acheck(self, token):
+        if not await self.ais_current(token):
+            raise TokenError(_("Token has been revoked"))
+
+    def bump(self, user_id):
+        """
+        Invalidates every token issued to user_id so far. Returns the new epoch.
+        """
+        users = self._users(user_id)
+        users.update(token_epoch=F("token_epoch") + 1)
+        epoch = users.values_list("token_epoch", flat=True).first() or 0
+
+        self.bumps += 1
+        if self.enabled:
+            self._cache().set(self._key(user_id), epoch, self.timeout)
+
+        return epoch
+
+    async def abump(self, user_id):
+        users = self._users(user_id)
+        await users.aupdate(token_epoch=F("token_epoch") + 1)
+        epoch = await users.values_list("token_epoch", flat=True).afirst() or 0
+
+        self.bumps += 1
+        if self.enabled:
+            await self._cache().aset(self._key(user_id), epoch, self.timeout)
+
+        return epoch
+
+    def stats(self):
+        return {
+            "checks": self.checks,
+            "misses": self.misses,
+            "rejections": self.rejections,
+            "bumps": self.bumps,
+        }
+
+
+token_epochs = TokenEpochStore(
+    alias=getattr(settings, "AUTH_TOKEN_EPOCHS_CACHE", None),
+    timeout=getattr(settings, "AUTH_TOKEN_EPOCH_TTL", 300),
+)
+
+
+def revoke_all(user_id):
+    """
+    Logout everywhere without epochs: blacklists every unexpired refresh
+    token of user_id and revokes its token families. Access tokens stay
+    valid until they expire.
+    """
+    # imported here: users.revocation and users.families import the models too
+    from .families import token_families
+    from .revocation import revocation_index
+
+    tokens = list(
+        OutstandingToken.objects
+        .filter(user_id=user_id, expires_at__gt=timezone.now(), blacklistedtoken__isnull=True)
+        .only("id", "jti")
+    )
+    # bulk_create skips the post_save signal that feeds the revocation index
+    BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens], ignore_conflicts=True)
+    jtis = [token.jti for token in tokens]
+    transaction.on_commit(lambda: [revocation_index.add(jti) for jti in jtis])
+
+    if token_families.enabled:
+        for family_id in TokenFamily.objects.filter(user_id=user_id, revoked=False).values_list("family_id", flat=True):
+            token_families.revoke(family_id)
+
+    return len(tokens)
+
+
+@register()
+def check_epochs_cache(app_configs, **kwargs):
+    alias = getattr(settings, "AUTH_TOKEN_EPOCHS_CACHE", None)
+    if alias is None or not isinstance(caches[alias], LocMemCache):
+        return []
+
+    return [
+        Error(
+            f"AUTH_TOKEN_EPOCHS_CACHE names the per-process cache {alias!r}.",
+            hint=(
+                "A logout everywhere would only reach the worker that handled it. "
+                "Point it at a cache shared by all workers (Redis, Memcached)."
+            ),
+            id="users.E001",
+        )
+    ]
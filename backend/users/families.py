@@ -0,0 +1,307 @@
+"""
+Cache-backed refresh-token families (AUTH_TOKEN_FAMILIES_CACHE).
+
+Every login starts a family. Its refresh tokens carry the family id
+("fam") and a generation ("gen"); the family's current generation lives
+in a cache backend. A refresh atomically increments the generation and
+succeeds only if the result is the presented generation + 1, so rotation
+is one cache compare-and-set instead of an OutstandingToken and a
+BlacklistedToken insert. Any other result means an older token of the
+family was replayed, and the whole family is revoked. Access renewal and
+the verify views check the same state, so a revoked family's refresh
+tokens neither renew nor verify.
+
+A TokenFamily row is written when a family starts or is revoked; the
+generations are snapshotted to it at most every
+AUTH_TOKEN_FAMILY_SNAPSHOT_INTERVAL seconds per process. A family that
+dropped out of the cache is restored from its row, which may be a few
+rotations behind. With several workers the cache must be shared (Redis,
+Memcached), or each worker only sees its own rotations.
+"""
+
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import TokenFamily
+
+
+FAMILY_CLAIM = "fam"
+GENERATION_CLAIM = "gen"
+
+# stored in place of the generation; incr() on it never yields a valid one
+REVOKED = -(2 ** 62)
+
+
+class TokenFamilyStore:
+    def __init__(self, alias=None, snapshot_interval=30):
+        self.alias = alias
+        self.snapshot_interval = snapshot_interval
+        self.rotations = 0
+        self.reuses = 0
+        self.restores = 0
+        self.snapshots = 0
+        self._dirty = {}    # family_id -> (user_id, generation, exp)
+        self._next_snapshot = time.monotonic() + snapshot_interval
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.alias is not None
+
+    def _cache(self):
+        return caches[self.alias]
+
+    def _key(self, family_id):
+        return f"auth:family:{family_id}"
+
+    def _timeout(self):
+        return int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+    def _row(self, family_id, user_id, generation, exp):
+        return TokenFamily(
+            family_id=family_id, user_id=user_id, generation=generation,
+            expires_at=datetime_from_epoch(exp),
+        )
+
+    def _mark(self, family_id, user_id, generation, exp):
+        with self._lock:
+            self._dirty[family_id] = (user_id, generation, exp)
+
+    def _new_family(self, token):
+        family_id = uuid.uuid4().hex
+        token[FAMILY_CLAIM] = family_id
+        token[GENERATION_CLAIM] = 0
+        return family_id
+
+    def start(self, token, user_id):
+        """
+        Makes token the first generation of a new family.
+        """
+        family_id = self._new_family(token)
+        self._row(family_id, user_id, 0, token["exp"]).save()
+        self._cache().set(self._key(family_id), 0, self._timeout())
+
+    async def astart(self, token, user_id):
+        family_id = self._new_family(token)
+        await self._row(family_id, user_id, 0, token["exp"]).asave()
+        await self._cache().aset(self._key(family_id), 0, self._timeout())
+
+    def _restored_generation(self, row, generation):
+        if row is None or row.revoked or row.generation > generation:
+            return None
+        return generation
+
+    def _check(self, generation, current):
+        if current == generation + 1:
+            self.rotations += 1
+            return True
+
+        self.reuses += 1
+        return False
+
+    def rotate(self, token):
+        """
+        Advances the family of refresh token to the next generation and
+        updates the token's claims. Raises TokenError, after revoking the
+        family, if token is not the family's current generation.
+        """
+        family_id = token[FAMILY_CLAIM]
+        generation = token[GENERATION_CLAIM]
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        cache = self._cache()
+        key = self._key(family_id)
+
+        try:
+            current = cache.incr(key)
+        except ValueError:
+            # evicted or expired from the cache: fall back to the snapshot
+            self.restores += 1
+            row = TokenFamily.objects.filter(family_id=family_id).first()
+            restored = self._restored_generation(row, generation)
+            cache.add(key, REVOKED if restored is None else restored, self._timeout())
+            current = cache.incr(key)
+
+        if not self._check(generation, current):
+            if current > 0:
+                self.revoke(family_id)
+            raise TokenError(_("Token reuse detected, the session has been revoked"))
+
+        cache.touch(key, self._timeout())
+        token[GENERATION_CLAIM] = current
+        self._mark(family_id, user_id, current, token["exp"])
+
+    async def arotate(self, token):
+        family_id = token[FAMILY_CLAIM]
+        generation = token[GENERATION_CLAIM]
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        cache = self._cache()
+        key = self._key(family_id)
+
+        try:
+            current = await cache.aincr(key)
+        except ValueError:
+            self.restores += 1
+            row = await TokenFamily.objects.filter(family_id=family_id).afirst()
+            restored = self._restored_generation(row, generation)
+            await cache.aadd(key, REVOKED if restored is None else restored, self._timeout())
+            current = await cache.aincr(key)
+
+        if not self._check(generation, current):
+            if current > 0:
+                await self.arevoke(family_id)
+            raise TokenError(_("Token reuse detected, the session has been revoked"))
+
+        await cache.atouch(key, self._timeout())
+        token[GENERATION_CLAIM] = current
+        self._mark(family_id, user_id, current, token["exp"])
+
+    def _is_current(self, token, current, row):
+        if current is None:
+            # not cached: the snapshot may be a few rotations behind
+            if row is None or row.revoked:
+                return False
+            current = max(row.generation, token[GENERATION_CLAIM])
+
+        if current < 0:
+            # REVOKED, possibly incremented by replays since
+            return False
+
+        # access tokens minted from an earlier generation stay valid until
+        # they expire, as they do for CustomJWTAuthentication
+        if token.get(api_settings.TOKEN_TYPE_CLAIM) != "refresh":
+            return True
+
+        return token[GENERATION_CLAIM] == current
+
+    def is_current(self, token):
+        """
+        False if token belongs to a revoked family, or is a refresh token
+        of an older generation. Tokens without a family always pass.
+        """
+        if not (self.enabled and FAMILY_CLAIM in token):
+            return True
+
+        family_id = token[FAMILY_CLAIM]
+        current = self._cache().get(self._key(family_id))
+        row = None
+        if current is None:
+            row = TokenFamily.objects.filter(family_id=family_id).first()
+
+        return self._is_current(token, current, row)
+
+    async def ais_current(self, token):
+        if not (self.enabled and FAMILY_CLAIM in token):
+            return True
+
+        family_id = token[FAMILY_CLAIM]
+        current = await self._cache().aget(self._key(family_id))
+        row = None
+        if current is None:
+            row = await TokenFamily.objects.filter(family_id=family_id).afirst()
+
+        return self._is_current(token, current, row)
+
+    def check(self, token):
+        if not self.is_current(token):
+            raise TokenError(_("Token has been revoked"))
+
+    async def acheck(self, token):
+        if not await self.ais_current(token):
+            raise TokenError(_("Token has been revoked"))
+
+    def revoke(self, family_id):
+        with self._lock:
+            self._dirty.pop(family_id, None)
+
+        self._cache().set(self._key(family_id), REVOKED, self._timeout())
+        TokenFamily.objects.filter(family_id=family_id).update(revoked=True)
+
+    async def arevoke(self, family_id):
+        with self._lock:
+            self._dirty.pop(family_id, None)
+
+        await self._cache().aset(self._key(family_id), REVOKED, self._timeout())
+        await TokenFamily.objects.filter(family_id=family_id).aupdate(revoked=True)
+
+    def snapshot(self):
+        """
+        Writes the generations rotated since the last snapshot in one
+        upsert. Returns the number of families written.
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+
+        if dirty:
+            TokenFamily.objects.bulk_create(
+                [self._row(family_id, *state) for family_id, state in dirty.items()],
+                update_conflicts=True,
+                unique_fields=["family_id"],
+                update_fields=["generation", "expires_at", "updated_at"],
+            )
+            self.snapshots += 1
+
+        return len(dirty)
+
+    def maybe_snapshot(self, **kwargs):
+        """
+        request_finished receiver; snapshots at most every snapshot_interval.
+        """
+        now = time.monotonic()
+        if now < self._next_snapshot:
+            return
+
+        with self._lock:
+            if now < self._next_snapshot:
+                return
+            self._next_snapshot = now + self.snapshot_interval
+
+        self.snapshot()
+
+    def stats(self):
+        return {
+            "rotations": self.rotations,
+            "reuses": self.reuses,
+            "restores": self.restores,
+            "snapshots": self.snapshots,
+            "dirty": len(self._dirty),
+        }
+
+
+token_families = TokenFamilyStore(
+    alias=getattr(settings, "AUTH_TOKEN_FAMILIES_CACHE", None),
+    snapshot_interval=getattr(settings, "AUTH_TOKEN_FAMILY_SNAPSHOT_INTERVAL", 30),
+)
+
+
+def _family_of(raw_refresh):
+    if not (token_families.enabled and raw_refresh):
+        return None
+
+    try:
+        return UntypedToken(raw_refresh).get(FAMILY_CLAIM)
+    except TokenError:
+        return None
+
+
+def revoke_family_of(raw_refresh):
+    """
+    Revokes the family of a refresh token on logout, if it has one.
+    """
+    family_id = _family_of(raw_refresh)
+    if family_id is not None:
+        token_families.revoke(family_id)
+
+
+async def arevoke_family_of(raw_refresh):
+    family_id = _family_of(raw_refresh)
+    if family_id is not None:
+        await token_families.arevoke(family_id)
@@ -0,0 +1,227 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .timing import phase
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("Too many password operations in progress, try again later.")
+    default_code = "hashing_unavailable"
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _timed(func, *args):
+    # time.monotonic() is system-wide, so it can be compared with the parent
+    started_at = time.monotonic()
+    result = func(*args)
+    return result, started_at, time.monotonic()
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _verify_password(password, encoded):
+    return hashers.verify_password(password, encoded)
+
+
+def _warm_worker():
+    hashers.get_hasher()
+
+
+class PasswordHashingPool:
+    """
+    Bounded process pool for password hashing and verification, so PBKDF2
+    work does not run on the request workers.
+
+    At most max_pending operations may be queued or running; past that,
+    callers get HashingUnavailable (503) straight away instead of waiting.
+    With workers=0 everything runs inline.
+    """
+
+    def __init__(self, workers=2, max_pending=64):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def prewarm(self):
+        """
+        Starts the worker processes, which set Django up, ahead of the first
+        password operation.
+        """
+        if self.workers <= 0:
+            return
+
+        executor = self._get_executor()
+        for future in [executor.submit(_warm_worker) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        """
+        Stops the worker processes, waiting for running operations.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def _reset_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _submit(self, func, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingUnavailable()
+            self.pending += 1
+
+        try:
+            return self._get_executor().submit(_timed, func, *args), time.monotonic()
+        except BrokenProcessPool:
+            self._done()
+            self._reset_executor()
+            raise HashingUnavailable()
+
+    def _done(self):
+        with self._lock:
+            self.pending -= 1
+
+    def _record(self, queued_at, started_at, finished_at):
+        queue_wait = max(started_at - queued_at, 0.0)
+        hash_time = finished_at - started_at
+
+        with self._lock:
+            self.completed += 1
+            self.queue_wait_total += queue_wait
+            self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+            self.hash_time_total += hash_time
+            self.hash_time_max = max(self.hash_time_max, hash_time)
+
+    def run(self, func, *args):
+        if self.workers <= 0:
+            result, started_at, finished_at = _timed(func, *args)
+            self._record(started_at, started_at, finished_at)
+            return result
+
+        future, queued_at = self._submit(func, *args)
+        try:
+            result, started_at, finished_at = future.result()
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise HashingUnavailable()
+        finally:
+            self._done()
+
+        self._record(queued_at, started_at, finished_at)
+        return result
+
+    async def arun(self, func, *args):
+        if self.workers <= 0:
+            return self.run(func, *args)
+
+        future, queued_at = self._submit(func, *args)
+        try:
+            result, started_at, finished_at = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise HashingUnavailable()
+        finally:
+            self._done()
+
+        self._record(queued_at, started_at, finished_at)
+        return result
+
+    def stats(self):
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg": self.queue_wait_total / completed,
+            "queue_wait_max": self.queue_wait_max,
+            "hash_time_avg": self.hash_time_total / completed,
+            "hash_time_max": self.hash_time_max,
+        }
+
+
+hashing_pool = PasswordHashingPool(
+    workers=getattr(settings, "PASSWORD_HASHING_WORKERS", 2),
+    max_pending=getattr(settings, "PASSWORD_HASHING_MAX_PENDING", 64),
+)
+
+
+def make_password(password):
+    if password is None:
+        # unusable password, nothing to hash
+        return hashers.make_password(None)
+
+    with phase("password_hash"):
+        return hashing_pool.run(_make_password, password)
+
+
+async def amake_password(password):
+    if password is None:
+        return hashers.make_password(None)
+
+    with phase("password_hash"):
+        return await hashing_pool.arun(_make_password, password)
+
+
+def check_password(password, encoded, setter=None):
+    # unusable or unknown hashes still go through the pool; verify_password
+    # burns a fake hash for them to keep timings uniform
+    with phase("password_hash"):
+        is_correct, must_update = hashing_pool.run(_verify_password, password, encoded)
+
+    if setter and is_correct and must_update:
+        setter(password)
+
+    return is_correct
+
+
+async def acheck_password(password, encoded, setter=None):
+    with phase("password_hash"):
+        is_correct, must_update = await hashing_pool.arun(_verify_password, password, encoded)
+
+    if setter and is_correct and must_update:
+        await setter(password)
+
+    return is_correct
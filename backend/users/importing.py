@@ -0,0 +1,189 @@
+import csv
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model, hashers
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.db.models.lookups import In
+
+from .hashing import _init_worker, _make_password
+
+
+FIELDS = ("email", "password", "first_name", "last_name")
+
+
+def read_rows(stream, format):
+    """
+    Yields one dict per input record, from CSV (with a header row) or NDJSON.
+    """
+    if format == "csv":
+        yield from csv.DictReader(stream)
+        return
+
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class UserImporter:
+    """
+    Creates users from an iterable of row dicts in batches.
+
+    Each batch is normalised like UserAccountManager._create_user, stripped of
+    emails already seen in this run or present in the table in any case (one
+    query per batch), hashed on a process pool and written with one
+    bulk_create. The next batch is hashed while the current one is written.
+    A batch that still hits the unique index is written row by row, and the
+    conflicting rows are counted as duplicates.
+
+    New users are inactive unless is_active is set, as with create_user.
+    Rows without a password get an unusable one.
+    """
+
+    def __init__(self, batch_size=1000, workers=None, is_active=False, progress=None):
+        self.batch_size = batch_size
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self.is_active = is_active
+        self.progress = progress
+        self.read = 0
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.started = None
+        self._seen = set()
+        self._executor = None
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return self.created / elapsed if elapsed else 0.0
+
+    def run(self, rows):
+        self.started = time.monotonic()
+
+        if self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+
+        try:
+            pending = None
+            for batch in batched(rows, self.batch_size):
+                hashing = self._prepare(batch)
+                if pending is not None:
+                    self._write(*pending)
+                pending = hashing
+            if pending is not None:
+                self._write(*pending)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+        return self.stats()
+
+    def _prepare(self, batch):
+        """
+        Filters a batch down to new users and starts hashing their passwords.
+        """
+        User = get_user_model()
+        users = {}
+
+        for row in batch:
+            self.read += 1
+            email = User.objects.normalize_email(row.get("email") or "").lower()
+
+            try:
+                validate_email(email)
+            except ValidationError:
+                self.invalid += 1
+                continue
+
+            if email in self._seen:
+                self.duplicates += 1
+                continue
+
+            self._seen.add(email)
+            users[email] = row
+
+        # through the Lower(email) unique index, like get_by_email
+        existing = set(
+            User.objects.filter(In(Lower("email"), list(users))).values_list(Lower("email"), flat=True)
+        )
+        self.duplicates += len(existing)
+
+        users = [(email, row) for email, row in users.items() if email not in existing]
+        passwords = [row.get("password") or None for _, row in users]
+
+        if self._executor is None:
+            hashes = [hashers.make_password(password) for password in passwords]
+        else:
+            hashes = self._executor.map(
+                _make_password, passwords,
+                chunksize=max(len(passwords) // (self.workers * 4), 1),
+            )
+
+        return users, hashes
+
+    def _write(self, users, hashes):
+        User = get_user_model()
+
+        objs = [
+            User(
+                email=email, password=encoded,
+                first_name=row.get("first_name") or "",
+                last_name=row.get("last_name") or "",
+                is_active=self.is_active,
+            )
+            for (email, row), encoded in zip(users, hashes)
+        ]
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(objs)
+            self.created += len(objs)
+        except IntegrityError:
+            # some emails were registered by someone else since _prepare
+            self._write_each(objs)
+
+        if self.progress is not None:
+            self.progress(self)
+
+    def _write_each(self, objs):
+        for obj in objs:
+            try:
+                with transaction.atomic():
+                    obj.save(force_insert=True)
+            except IntegrityError:
+                self.duplicates += 1
+            else:
+                self.created += 1
+
+    def stats(self):
+        return {
+            "read": self.read,
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "seconds": time.monotonic() - self.started,
+            "rate": self.rate,
+        }
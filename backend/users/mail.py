@@ -0,0 +1,187 @@
+"""
+Persistent outbound-mail queue.
+
+With AUTH_MAIL_QUEUE=1 (EMAIL_BACKEND = "users.mail.QueuedEmailBackend"),
+every send (djoser's activation and password-reset mails, approval
+confirmations, ...) becomes an OutgoingEmail row and returns immediately.
+The send_queued_mail command drains the queue: it claims due rows in
+batches, delivers each batch over one connection of
+AUTH_MAIL_DELIVERY_BACKEND, deletes what was sent and retries the rest
+with exponential backoff. It has to be kept running (send_queued_mail
+--loop); nothing else sends queued mail. Several workers may run at once.
+
+Queued are the sender, To/Cc/Bcc recipients, Reply-To, extra headers,
+subject, text and HTML bodies. Messages with attachments or other
+alternatives are refused (ValueError) rather than sent without them.
+"""
+
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        now = timezone.now()
+        rows = []
+
+        for message in email_messages:
+            alternatives = getattr(message, "alternatives", [])
+            if message.attachments or any(mimetype != "text/html" for _, mimetype in alternatives):
+                raise ValueError("QueuedEmailBackend cannot queue attachments or non-HTML alternatives.")
+
+            html = next((content for content, _ in alternatives), "")
+            if not html and message.content_subtype == "html":
+                html, body = message.body, ""
+            else:
+                body = message.body
+
+            rows.append(OutgoingEmail(
+                from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+                to=list(message.to), cc=list(message.cc), bcc=list(message.bcc),
+                reply_to=list(message.reply_to), headers=dict(message.extra_headers),
+                subject=message.subject, body=body, html=html, next_attempt_at=now,
+            ))
+
+        OutgoingEmail.objects.bulk_create(rows)
+        return len(rows)
+
+
+def build_message(row, connection=None):
+    message = EmailMultiAlternatives(
+        row.subject, row.body, row.from_email, row.to, connection=connection,
+        cc=row.cc, bcc=row.bcc, reply_to=row.reply_to, headers=row.headers,
+    )
+    if row.html:
+        if row.body:
+            message.attach_alternative(row.html, "text/html")
+        else:
+            message.body = row.html
+            message.content_subtype = "html"
+    return message
+
+
+def retry_delay(attempts):
+    delay = getattr(settings, "AUTH_MAIL_RETRY_DELAY", 30) * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, getattr(settings, "AUTH_MAIL_RETRY_MAX_DELAY", 3600)))
+
+
+def claim_batch(batch_size, now=None):
+    """
+    Takes up to batch_size due messages and pushes their next attempt past
+    AUTH_MAIL_LEASE seconds, so concurrent workers skip them and a worker
+    that dies mid-batch only delays them.
+
+    Rows are claimed with one conditional UPDATE that only matches them while
+    they are still due, so two workers never claim the same row; it needs no
+    row locks, which SQLite does not have.
+    """
+    now = now or timezone.now()
+    lease = timedelta(seconds=getattr(settings, "AUTH_MAIL_LEASE", 300))
+    due = OutgoingEmail.objects.filter(failed=False, next_attempt_at__lte=now)
+
+    while True:
+        candidates = list(due.order_by("next_attempt_at", "id").values_list("pk", flat=True)[:batch_size])
+        if not candidates:
+            return []
+
+        claim = uuid.uuid4()
+        if due.filter(pk__in=candidates).update(next_attempt_at=now + lease, claim=claim):
+            return list(OutgoingEmail.objects.filter(pk__in=candidates, claim=claim).order_by("id"))
+        # another worker claimed all of them first
+
+
+def record_failure(rows, now=None):
+    """
+    Schedules the next attempt for rows (with last_error set), or marks
+    them failed after AUTH_MAIL_MAX_ATTEMPTS.
+    """
+    now = now or timezone.now()
+    max_attempts = getattr(settings, "AUTH_MAIL_MAX_ATTEMPTS", 5)
+
+    for row in rows:
+        row.attempts += 1
+        row.failed = row.attempts >= max_attempts
+        row.next_attempt_at = now + retry_delay(row.attempts)
+
+    OutgoingEmail.objects.bulk_update(rows, ["attempts", "last_error", "failed", "next_attempt_at"])
+
+
+def send_batch(rows):
+    """
+    Delivers rows over one connection. Returns (sent, failed).
+    """
+    connection = get_connection(
+        getattr(settings, "AUTH_MAIL_DELIVERY_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+    )
+    sent, failed = [], []
+
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning("Could not connect to deliver queued mail: %s", e)
+        for row in rows:
+            row.last_error = repr(e)
+        record_failure(rows)
+        return 0, len(rows)
+
+    try:
+        for row in rows:
+            try:
+                connection.send_messages([build_message(row, connection)])
+            except Exception as e:
+                logger.warning("Delivering queued mail %s failed: %s", row.pk, e)
+                row.last_error = repr(e)
+                failed.append(row)
+            else:
+                sent.append(row.pk)
+    finally:
+        connection.close()
+
+    OutgoingEmail.objects.filter(pk__in=sent).delete()
+    if failed:
+        record_failure(failed)
+
+    return len(sent), len(failed)
+
+
+def drain_queue(batch_size=None, max_batches=None):
+    """
+    Sends due messages batch by batch until none are left (or max_batches
+    have run). Returns (sent, failed).
+    """
+    batch_size = batch_size or getattr(settings, "AUTH_MAIL_BATCH_SIZE", 50)
+    sent = failed = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        rows = claim_batch(batch_size)
+        if not rows:
+            break
+
+        batch_sent, batch_failed = send_batch(rows)
+        sent += batch_sent
+        failed += batch_failed
+        batches += 1
+
+    return sent, failed
+
+
+def queue_stats():
+    now = timezone.now()
+    queued = OutgoingEmail.objects.filter(failed=False)
+    return {
+        "queued": queued.count(),
+        "due": queued.filter(next_attempt_at__lte=now).count(),
+        "retrying": queued.filter(attempts__gt=0).count(),
+        "failed": OutgoingEmail.objects.filter(failed=True).count(),
+    }
@@ -0,0 +1,328 @@
+import contextvars
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+
+ENDPOINTS = ["create", "verify", "me", "refresh", "logout"]
+
+PASSWORD = "bench-password-123"
+
+# per-request query counter, set by the server wrappers below
+_queries = contextvars.ContextVar("bench_auth_queries", default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_counter(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def counting_wsgi(application, query_counts):
+    def app(environ, start_response):
+        counter = [0]
+        token = _queries.set(counter)
+        try:
+            return application(environ, start_response)
+        finally:
+            _queries.reset(token)
+            query_counts.append((environ["PATH_INFO"], counter[0]))
+
+    return app
+
+
+def counting_asgi(application, query_counts):
+    async def app(scope, receive, send):
+        counter = [0]
+        token = _queries.set(counter)
+        try:
+            await application(scope, receive, send)
+        finally:
+            _queries.reset(token)
+            if scope["type"] == "http":
+                query_counts.append((scope["path"], counter[0]))
+
+    return app
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds users in a throwaway database, drives the auth endpoints "
+        "concurrently against a local WSGI or ASGI server and reports latency "
+        "percentiles, throughput and DB queries per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200, help="UserAccount rows to seed")
+        parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi")
+        parser.add_argument("--output", help="write machine-readable results to this JSON file")
+        parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--users, --requests and --concurrency must be positive")
+
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+
+        db_dir = tempfile.mkdtemp(prefix="bench_auth_")
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(db_dir, "bench.sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        try:
+            self.seed(options["users"])
+            # every request comes from 127.0.0.1, which the per-IP login
+            # throttle would cut off after a few dozen logins
+            with override_settings(AUTH_THROTTLE_RATES={}):
+                results = self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.report(results, baseline)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def seed(self, count):
+        User = get_user_model()
+        # hash once; hashing every row would dominate the setup time
+        password = make_password(PASSWORD)
+
+        User.objects.bulk_create(
+            [
+                User(
+                    email=f"bench{i}@example.com", password=password,
+                    first_name="Bench", last_name=str(i), is_active=True,
+                )
+                for i in range(count)
+            ],
+            batch_size=1000,
+        )
+
+    def start_server(self, kind, query_counts):
+        connection_created.connect(_install_counter)
+
+        if kind == "wsgi":
+            from django.core.wsgi import get_wsgi_application
+
+            server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+            server.set_app(counting_wsgi(get_wsgi_application(), query_counts))
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+
+            return server.server_address[1], server.shutdown
+
+        try:
+            import uvicorn
+        except ImportError as e:
+            raise CommandError("--server asgi requires uvicorn to be installed") from e
+
+        from django.core.asgi import get_asgi_application
+
+        config = uvicorn.Config(
+            counting_asgi(get_asgi_application(), query_counts),
+            host="127.0.0.1", port=0, log_level="warning", lifespan="off",
+        )
+        server = uvicorn.Server(config)
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+
+        while not server.started:
+            time.sleep(0.01)
+
+        port = server.servers[0].sockets[0].getsockname()[1]
+
+        def stop():
+            server.should_exit = True
+            thread.join()
+
+        return port, stop
+
+    def run_benchmark(self, options):
+        query_counts = []
+        port, stop = self.start_server(options["server"], query_counts)
+        sessions = [
+            {"email": f"bench{i % options['users']}@example.com"}
+            for i in range(options["requests"])
+        ]
+        results = {
+            "commit": self.git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "server": options["server"],
+            "users": options["users"],
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "endpoints": {},
+        }
+
+        try:
+            local = threading.local()
+
+            def request(method, path, body=None, cookies=None):
+                conn = getattr(local, "conn", None)
+                if conn is None:
+                    conn = local.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                    conn.connect()
+                    # headers and body go out as separate writes; avoid the delayed-ACK stall
+                    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+                # as a browser would send it, for the CSRF check on cookie sessions
+                headers = {"Content-Type": "application/json", "Origin": f"http://127.0.0.1:{port}"}
+                if cookies:
+                    headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+
+                started = time.perf_counter()
+                try:
+                    conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+                    response = conn.getresponse()
+                    payload = response.read()
+                except (OSError, http.client.HTTPException):
+                    local.conn = None
+                    conn.close()
+                    return time.perf_counter() - started, 0, None, {}
+
+                elapsed = time.perf_counter() - started
+                jar = SimpleCookie()
+                for header in response.headers.get_all("Set-Cookie") or []:
+                    jar.load(header)
+
+                return elapsed, response.status, payload, {k: m.value for k, m in jar.items()}
+
+            def create(session):
+                elapsed, code, payload, cookies = request(
+                    "POST", "/api/jwt/create/", {"email": session["email"], "password": PASSWORD}
+                )
+                session["cookies"] = cookies
+                return elapsed, code
+
+            def verify(session):
+                token = session["cookies"].get(settings.AUTH_COOKIE_ACCESS_KEY, "")
+                return request("POST", "/api/jwt/verify/", {"token": token})[:2]
+
+            def me(session):
+                return request("GET", "/api/users/me/", cookies=session["cookies"])[:2]
+
+            def refresh(session):
+                return request("POST", "/api/jwt/refresh/", {}, session["cookies"])[:2]
+
+            def logout(session):
+                return request("POST", "/api/logout/", {}, session["cookies"])[:2]
+
+            for name, func in zip(ENDPOINTS, [create, verify, me, refresh, logout]):
+                del query_counts[:]
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(options["concurrency"]) as pool:
+                    samples = list(pool.map(func, sessions))
+                wall = time.perf_counter() - started
+
+                results["endpoints"][name] = self.summarize(samples, wall, query_counts)
+        finally:
+            stop()
+            connection_created.disconnect(_install_counter)
+
+        return results
+
+    def summarize(self, samples, wall, query_counts):
+        latencies = [elapsed * 1000 for elapsed, _ in samples]
+        errors = sum(1 for _, code in samples if not 200 <= code < 300)
+        queries = [count for _, count in query_counts]
+
+        return {
+            "count": len(samples),
+            "errors": errors,
+            "throughput_rps": len(samples) / wall if wall else None,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": max(latencies),
+            "db_queries_per_request": sum(queries) / len(queries) if queries else 0,
+        }
+
+    def git_commit(self):
+        try:
+            return subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True,
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def report(self, results, baseline=None):
+        self.stdout.write(
+            f"{results['server']} server, {results['users']} users, "
+            f"{results['requests']} requests/endpoint, concurrency {results['concurrency']}, "
+            f"commit {results['commit']}"
+        )
+        self.stdout.write(
+            f"{'endpoint':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'req/s':>10}{'queries':>10}{'errors':>8}"
+        )
+
+        for name, stats in results["endpoints"].items():
+            self.stdout.write(
+                f"{name:<10}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                f"{stats['throughput_rps']:>10.1f}{stats['db_queries_per_request']:>10.2f}{stats['errors']:>8}"
+            )
+
+            old = (baseline or {}).get("endpoints", {}).get(name)
+            if old:
+                self.stdout.write(
+                    f"{'  vs ' + str(baseline.get('commit')):<10}"
+                    f"{self.delta(old['p50_ms'], stats['p50_ms']):>10}"
+                    f"{self.delta(old['p95_ms'], stats['p95_ms']):>10}"
+                    f"{self.delta(old['p99_ms'], stats['p99_ms']):>10}"
+                    f"{self.delta(old['throughput_rps'], stats['throughput_rps']):>10}"
+                    f"{stats['db_queries_per_request'] - old['db_queries_per_request']:>+10.2f}"
+                )
+
+    def delta(self, old, new):
+        if not old:
+            return "-"
+        return f"{(new - old) / old * 100:+.1f}%"
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.pruning import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired outstanding and blacklisted tokens in bounded "
+        "primary-key batches. Unlike flushexpiredtokens it never runs one "
+        "long delete, and can stop after a time budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int,
+            default=getattr(settings, "AUTH_TOKEN_PRUNE_BATCH_SIZE", 1000),
+            help="width of each primary-key window",
+        )
+        parser.add_argument(
+            "--time-budget", type=float, default=None,
+            help="stop starting new batches after this many seconds",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        deleted = prune_expired_tokens(options["batch_size"], options["time_budget"])
+
+        self.stdout.write(
+            f"Deleted {deleted} expired tokens in {time.monotonic() - started:.2f}s"
+        )
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.mail import drain_queue, queue_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Delivers mail queued by users.mail.QueuedEmailBackend in batches, "
+        "one connection per batch, retrying failures with backoff. Runs once, "
+        "or keeps polling with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int,
+            default=getattr(settings, "AUTH_MAIL_BATCH_SIZE", 50),
+            help="messages sent per connection",
+        )
+        parser.add_argument("--loop", action="store_true", help="keep running and poll for new mail")
+        parser.add_argument(
+            "--interval", type=float, default=1.0,
+            help="seconds between polls of an empty queue with --loop",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            sent, failed = drain_queue(options["batch_size"])
+
+            if sent or failed or not options["loop"]:
+                self.stdout.write(
+                    f"Sent {sent} messages, {failed} failed, in "
+                    f"{time.monotonic() - started:.2f}s; queue: {queue_stats()}"
+                )
+
+            if not options["loop"]:
+                break
+
+            time.sleep(options["interval"])
@@ -0,0 +1,52 @@
+import os
+import re
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from users.prefork import PreforkServer
+
+
+ADDRPORT = re.compile(r"^(?:(?P<host>[^\s\[\]]+|\[[0-9a-fA-F:]+\]):)?(?P<port>\d+)$")
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves the application from N pre-forked, pre-warmed worker "
+        "processes. Send HUP for a graceful reload, USR1 for per-worker "
+        "request counts and TERM or INT to stop."
+    )
+
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("addrport", nargs="?", default="127.0.0.1:8000", help="[host:]port to listen on")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            "--graceful-timeout", type=float, default=30,
+            help="seconds a stopping worker may spend on its current request",
+        )
+        parser.add_argument("--access-log", action="store_true", help="log every request")
+
+    def handle(self, *args, **options):
+        if not hasattr(os, "fork"):
+            raise CommandError("serve_auth needs os.fork(); use a WSGI server instead")
+
+        if options["workers"] < 1:
+            raise CommandError("--workers must be positive")
+
+        match = ADDRPORT.match(options["addrport"])
+        if match is None:
+            raise CommandError(f"{options['addrport']!r} is not a valid [host:]port")
+        host = (match["host"] or "127.0.0.1").strip("[]")
+
+        server = PreforkServer(
+            WSGIHandler(),
+            host,
+            int(match["port"]),
+            options["workers"],
+            graceful_timeout=options["graceful_timeout"],
+            access_log=options["access_log"],
+            stdout=self.stdout,
+        )
+        server.serve()
@@ -0,0 +1,130 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+PROFILES = ["full_auth.settings", "full_auth.settings_api"]
+
+# Runs in a fresh interpreter per sample, so every import is a cold one.
+PROBE = r"""
+import json, sys, time
+
+started_at = time.perf_counter()
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+timings = {"import": time.perf_counter() - started_at}
+
+mark = time.perf_counter()
+django.setup(set_prefix=False)
+timings["setup"] = time.perf_counter() - mark
+
+mark = time.perf_counter()
+application = WSGIHandler()
+timings["middleware"] = time.perf_counter() - mark
+
+mark = time.perf_counter()
+if getattr(settings, "AUTH_PREWARM", False):
+    from users.prewarm import prewarm
+    prewarm()
+timings["prewarm"] = time.perf_counter() - mark
+
+from django.test import RequestFactory
+
+def request():
+    environ = RequestFactory().post(
+        sys.argv[1], data=json.dumps({"token": "startup-report"}),
+        content_type="application/json", HTTP_HOST="localhost",
+    ).environ
+    statuses = []
+    mark = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b"".join(response)
+    response.close()
+    return time.perf_counter() - mark, statuses[0]
+
+timings["first_request"], status = request()
+timings["second_request"], _ = request()
+
+print(json.dumps({
+    "timings": timings,
+    "status": status,
+    "modules": len(sys.modules),
+    "apps": len(settings.INSTALLED_APPS),
+    "middleware": len(settings.MIDDLEWARE),
+}))
+"""
+
+PHASES = ["import", "setup", "middleware", "prewarm", "first_request", "second_request"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts each settings profile in fresh interpreters and reports the "
+        "median time spent importing, setting up, warming and serving the "
+        "first and second request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("profiles", nargs="*", default=PROFILES, help="settings modules to compare")
+        parser.add_argument("--repeat", type=int, default=5, help="cold starts per profile")
+        parser.add_argument("--path", default="/api/jwt/verify/", help="endpoint the requests POST to")
+        parser.add_argument("--output", help="write machine-readable results to this JSON file")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be positive")
+
+        results = {
+            profile: self.measure(profile, options["repeat"], options["path"])
+            for profile in options["profiles"]
+        }
+        self.report(results)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def probe(self, profile, path):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": profile}
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE, path],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"{profile} failed to start:\n{result.stderr}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def measure(self, profile, repeat, path):
+        samples = [self.probe(profile, path) for _ in range(repeat)]
+        last = samples[-1]
+        return {
+            "median_ms": {
+                phase: statistics.median(sample["timings"][phase] for sample in samples) * 1000
+                for phase in PHASES
+            },
+            "status": last["status"],
+            "modules": last["modules"],
+            "apps": last["apps"],
+            "middleware": last["middleware"],
+        }
+
+    def report(self, results):
+        width = max(len(profile) for profile in results) + 2
+        self.stdout.write(
+            f"{'profile':<{width}}" + "".join(f"{phase + ' ms':>18}" for phase in PHASES)
+            + f"{'modules':>10}{'apps':>6}{'mw':>6}"
+        )
+        for profile, result in results.items():
+            self.stdout.write(
+                f"{profile:<{width}}"
+                + "".join(f"{result['median_ms'][phase]:>18.1f}" for phase in PHASES)
+                + f"{result['modules']:>10}{result['apps']:>6}{result['middleware']:>6}"
+            )
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+INDEX = models.Index(fields=["expires_at", "id"], name="outstandingtoken_expiry_idx")
+
+
+def add_index(apps, schema_editor):
+    OutstandingToken = apps.get_model("token_blacklist", "OutstandingToken")
+    schema_editor.add_index(OutstandingToken, INDEX)
+
+
+def remove_index(apps, schema_editor):
+    OutstandingToken = apps.get_model("token_blacklist", "OutstandingToken")
+    schema_editor.remove_index(OutstandingToken, INDEX)
+
+
+class Migration(migrations.Migration):
+    """
+    Index for the expiry scan in users.pruning. OutstandingToken belongs to
+    simplejwt's token_blacklist app, so the index is created here directly
+    rather than through that app's model state.
+    """
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_outstandingtoken_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_email', models.CharField(max_length=255)),
+                ('to', models.JSONField()),
+                ('subject', models.TextField()),
+                ('body', models.TextField()),
+                ('html', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('next_attempt_at', models.DateTimeField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('failed', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['failed', 'next_attempt_at'], name='outgoingemail_due_idx')],
+            },
+        ),
+    ]
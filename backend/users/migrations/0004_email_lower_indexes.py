@@ -0,0 +1,76 @@
+from django.db import migrations, models
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+
+UNIQUE = models.UniqueConstraint(Lower("email"), name="useraccount_email_lower_uniq")
+ACTIVE = models.Index(Lower("email"), condition=Q(is_active=True), name="useraccount_active_email_idx")
+
+
+def check_duplicates(UserAccount):
+    duplicates = (
+        UserAccount.objects.values(lower=Lower("email"))
+        .annotate(count=models.Count("id"))
+        .filter(count__gt=1)
+        .values_list("lower", flat=True)[:10]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Emails that differ only in case must be merged before this "
+            f"migration can add a case-insensitive unique index: {', '.join(duplicates)}"
+        )
+
+
+def add_indexes(apps, schema_editor):
+    UserAccount = apps.get_model("users", "UserAccount")
+    # fail before spending time on an index build that cannot succeed
+    check_duplicates(UserAccount)
+
+    if schema_editor.connection.vendor == "postgresql":
+        # CONCURRENTLY builds without blocking writes to the table
+        schema_editor.add_index(UserAccount, ACTIVE, concurrently=True)
+        schema_editor.execute(
+            str(UNIQUE.create_sql(UserAccount, schema_editor)).replace(
+                "CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX CONCURRENTLY", 1,
+            )
+        )
+    else:
+        schema_editor.add_index(UserAccount, ACTIVE)
+        schema_editor.add_constraint(UserAccount, UNIQUE)
+
+
+def remove_indexes(apps, schema_editor):
+    UserAccount = apps.get_model("users", "UserAccount")
+    concurrently = {"concurrently": True} if schema_editor.connection.vendor == "postgresql" else {}
+
+    schema_editor.remove_index(UserAccount, ACTIVE, **concurrently)
+    if concurrently:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(UNIQUE.name)}")
+    else:
+        schema_editor.remove_constraint(UserAccount, UNIQUE)
+
+
+class Migration(migrations.Migration):
+    """
+    Case-insensitive unique index on the email and a partial index for
+    active users' email lookups. On PostgreSQL both are built CONCURRENTLY,
+    which cannot run inside a transaction, hence atomic = False.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0003_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_indexes, remove_indexes),
+            ],
+            state_operations=[
+                migrations.AddIndex(model_name='useraccount', index=ACTIVE),
+                migrations.AddConstraint(model_name='useraccount', constraint=UNIQUE),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_tokenfamily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('event', models.CharField(max_length=32)),
+                ('outcome', models.CharField(max_length=16)),
+                ('status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('code', models.CharField(blank=True, max_length=64)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('identifier', models.CharField(blank=True, max_length=255)),
+                ('ip', models.CharField(blank=True, max_length=64)),
+                ('user_agent', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='auditevent_created_idx'), models.Index(fields=['user_id', 'created_at'], name='auditevent_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_auditevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccount',
+            name='token_epoch',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_useraccount_token_epoch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='bcc',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='cc',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='claim',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='headers',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='reply_to',
+            field=models.JSONField(default=list),
+        ),
+    ]
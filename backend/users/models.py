@@ -1,8 +1,29 @@
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, PermissionsMixin
 
+from . import hashing
+
 
 class UserAccountManager(BaseUserManager):
+    def email_lookup(self, email):
+        """
+        Case-insensitive match on the email, served by the Lower(email)
+        indexes on UserAccount.
+        """
+        return Exact(Lower(self.model.USERNAME_FIELD), email.lower())
+
+    def get_by_email(self, email, **filters):
+        return self.get(self.email_lookup(email), **filters)
+
+    def get_by_natural_key(self, username):
+        return self.get_by_email(username)
+
+    async def aget_by_natural_key(self, username):
+        return await self.aget(self.email_lookup(username))
+
     def _create_user(self, email, password=None, **extra_fields):
         """
         Creates and saves a User with the given email, and password.
@@ -50,10 +71,127 @@ class UserAccount(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
 
+    # bumped to revoke every token issued so far (users.epochs)
+    token_epoch = models.PositiveIntegerField(default=0, editable=False)
+
     objects = UserAccountManager()
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["first_name", "last_name"]
 
+    class Meta:
+        # built by migration 0004, concurrently on PostgreSQL
+        constraints = [
+            models.UniqueConstraint(Lower("email"), name="useraccount_email_lower_uniq"),
+        ]
+        indexes = [
+            models.Index(Lower("email"), condition=Q(is_active=True), name="useraccount_active_email_idx"),
+        ]
+
     def __str__(self) -> str:
         return self.email
+
+    # Password hashing and checks run on users.hashing's process pool, which
+    # covers login, _create_user and djoser's set/reset password flows.
+
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    async def aset_password(self, raw_password):
+        self.password = await hashing.amake_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return hashing.check_password(raw_password, self.password, setter)
+
+    async def acheck_password(self, raw_password):
+        async def setter(raw_password):
+            await self.aset_password(raw_password)
+            self._password = None
+            await self.asave(update_fields=["password"])
+
+        return await hashing.acheck_password(raw_password, self.password, setter)
+
+
+class OutgoingEmail(models.Model):
+    """
+    A message waiting in users.mail's outbound queue. Rows are deleted once
+    delivered; failed is set after AUTH_MAIL_MAX_ATTEMPTS tries.
+    """
+
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField()
+    cc = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+    headers = models.JSONField(default=dict)
+    subject = models.TextField()
+    body = models.TextField()
+    html = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField()
+    claim = models.UUIDField(null=True, editable=False)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    failed = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [models.Index(fields=["failed", "next_attempt_at"], name="outgoingemail_due_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+
+class TokenFamily(models.Model):
+    """
+    Durable snapshot of a refresh-token family kept in users.families'
+    cache store. The generation may lag behind the cache; revocations are
+    written straight away.
+    """
+
+    family_id = models.CharField(max_length=32, unique=True)
+    user = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="token_families")
+    generation = models.PositiveIntegerField(default=0)
+    revoked = models.BooleanField(default=False)
+    expires_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "token families"
+
+    def __str__(self) -> str:
+        return f"{self.family_id} ({self.user_id}, generation {self.generation})"
+
+
+class AuditEvent(models.Model):
+    """
+    An authentication event written by users.audit's database sink.
+    user_id is a plain column, not a foreign key: events outlive their
+    users and the writer should not join or cascade.
+    """
+
+    created_at = models.DateTimeField()
+    event = models.CharField(max_length=32)
+    outcome = models.CharField(max_length=16)
+    status = models.PositiveSmallIntegerField(null=True, blank=True)
+    code = models.CharField(max_length=64, blank=True)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    identifier = models.CharField(max_length=255, blank=True)
+    ip = models.CharField(max_length=64, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="auditevent_created_idx"),
+            models.Index(fields=["user_id", "created_at"], name="auditevent_user_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.created_at:%Y-%m-%d %H:%M:%S} {self.event} {self.outcome}"
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from django.conf import settings
+from rest_framework_simplejwt.settings import api_settings
+
+from .user_cache import UserCache
+
+
+class PermissionCache(UserCache):
+    """
+    Precomputed permission sets ("app_label.codename" strings) per user,
+    with the same two tiers as the user snapshot cache. Filled by
+    users.backends.CachedPermissionsBackend and invalidated by the m2m
+    signal handlers in users.signals.
+
+    Permission claims embedded in access tokens are only trusted if the
+    token was issued after the last change to that user's permissions
+    (is_fresh). The change times are kept in the shared tier, so every
+    worker sees them; without one, only this process's changes are known,
+    and tokens issued before it started are not trusted at all.
+    """
+
+    key_prefix = "users:perms:"
+    generation_key = "users:perms:generation"
+    changed_key_prefix = "users:perms:changed:"
+    cleared_key = "users:perms:cleared"
+
+    def __init__(self, maxsize=1024, ttl=60, backend=None, max_age=86400):
+        super().__init__(maxsize, ttl, backend)
+        self.max_age = max_age
+        self._changed = {}   # user_id -> time.time() of the last invalidation
+        self._cleared_at = 0.0 if backend is not None else time.time()
+        self._changed_lock = threading.Lock()
+
+    def invalidate(self, user_id):
+        super().invalidate(user_id)
+        now = time.time()
+
+        shared = self._shared()
+        if shared is not None:
+            # tokens issued before now - max_age have expired anyway
+            shared.set(f"{self.changed_key_prefix}{user_id}", now, self.max_age)
+
+        with self._changed_lock:
+            self._changed[str(user_id)] = now
+
+            if len(self._changed) > self.maxsize:
+                # tokens issued before now - max_age have expired anyway
+                for key, changed_at in list(self._changed.items()):
+                    if changed_at < now - self.max_age:
+                        del self._changed[key]
+
+    def clear(self):
+        super().clear()
+        now = time.time()
+
+        with self._changed_lock:
+            self._cleared_at = now
+            self._changed.clear()
+
+        shared = self._shared()
+        if shared is not None:
+            shared.set(self.cleared_key, now, self.max_age)
+
+    def is_fresh(self, user_id, issued_at):
+        changed_at = max(self._cleared_at, self._changed.get(str(user_id), 0.0))
+
+        shared = self._shared()
+        if shared is not None:
+            stamps = shared.get_many([self.cleared_key, f"{self.changed_key_prefix}{user_id}"])
+            changed_at = max(changed_at, *stamps.values(), 0.0)
+
+        return issued_at > changed_at
+
+
+permission_cache = PermissionCache(
+    maxsize=getattr(settings, "AUTH_USER_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "AUTH_USER_CACHE_TTL", 60),
+    backend=getattr(settings, "AUTH_USER_CACHE_BACKEND", None),
+    max_age=api_settings.REFRESH_TOKEN_LIFETIME.total_seconds(),
+)
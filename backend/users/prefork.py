@@ -0,0 +1,296 @@
+"""
+Pre-forking WSGI server behind `manage.py serve_auth`.
+
+The parent loads and warms the application, opens the listening socket
+and forks the workers, so the imported code and the warmed caches are
+shared copy-on-write. Each worker starts its own password-hashing
+processes before it accepts connections, then serves one request at a
+time with Django's WSGIServer on the shared socket. Workers that die are
+replaced.
+
+Signals to the parent:
+
+    HUP       graceful reload: re-executes the command on the same socket,
+              starts and warms new workers, then lets the old ones finish
+              their requests and exit
+    USR1      prints the request count of each worker
+    TERM/INT  graceful shutdown
+"""
+
+import os
+import select
+import selectors
+import signal
+import socket
+import sys
+import time
+import traceback
+from multiprocessing.sharedctypes import RawArray
+
+from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer
+from django.db import connections
+
+from .audit import audit_log
+from .families import token_families
+from .hashing import hashing_pool
+from .prewarm import prewarm
+
+
+LISTEN_FD_ENV = "SERVE_AUTH_LISTEN_FD"
+OLD_WORKERS_ENV = "SERVE_AUTH_OLD_WORKERS"
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class WorkerServer(WSGIServer):
+    """
+    WSGIServer on a socket it shares with the other workers.
+    """
+
+    def __init__(self, listener, handler_class):
+        super().__init__(listener.getsockname()[:2], handler_class, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        self.server_name = socket.getfqdn(self.server_address[0])
+        self.server_port = self.server_address[1]
+        self.setup_environ()
+
+    def serve_until(self, stopped):
+        """
+        serve_forever() with a stop condition a signal handler can set; the
+        non-blocking socket would turn handle_request() into a busy loop.
+        """
+        with selectors.DefaultSelector() as selector:
+            selector.register(self, selectors.EVENT_READ)
+
+            while not stopped():
+                if selector.select(1):
+                    self._handle_request_noblock()
+
+    def get_request(self):
+        # the listener is non-blocking so that workers losing the race for
+        # a connection move on instead of blocking in accept()
+        connection, address = self.socket.accept()
+        connection.setblocking(True)
+        return connection, address
+
+
+class PreforkServer:
+    def __init__(self, application, host, port, workers, graceful_timeout=30,
+                 access_log=False, argv=None, stdout=None):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.graceful_timeout = graceful_timeout
+        self.handler_class = WSGIRequestHandler if access_log else QuietRequestHandler
+        self.argv = argv or sys.argv
+        self.stdout = stdout or sys.stdout
+        self.requests = RawArray("Q", workers)     # per slot, each written by one worker
+        self.workers = {}                           # pid -> slot
+        self.listener = None
+        self._stopping = False
+        self._reloading = False
+        self._reporting = False
+
+    def log(self, message):
+        self.stdout.write(f"[serve_auth {os.getpid()}] {message}\n")
+        self.stdout.flush()
+
+    def listen(self):
+        fd = os.environ.pop(LISTEN_FD_ENV, None)
+
+        if fd is not None:
+            listener = socket.socket(fileno=int(fd))
+        else:
+            family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+            listener = socket.create_server((self.host, self.port), family=family, backlog=1024)
+
+        listener.setblocking(False)
+        listener.set_inheritable(True)
+        return listener
+
+    # worker side
+
+    def run_worker(self, slot, ready_fd):
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        for signum in (signal.SIGINT, signal.SIGHUP, signal.SIGUSR1):
+            signal.signal(signum, signal.SIG_IGN)
+
+        hashing_pool.prewarm()
+
+        requests = self.requests
+        application = self.application
+
+        def counting_application(environ, start_response):
+            requests[slot] += 1
+            return application(environ, start_response)
+
+        server = WorkerServer(self.listener, self.handler_class)
+        server.set_app(counting_application)
+
+        if ready_fd is not None:
+            os.write(ready_fd, b".")
+            os.close(ready_fd)
+
+        server.serve_until(lambda: stopping)
+
+        if token_families.enabled:
+            token_families.snapshot()
+        audit_log.flush()
+        hashing_pool.shutdown()
+        connections.close_all()
+
+    def spawn(self, slot, ready_fd=None):
+        self.requests[slot] = 0
+        pid = os.fork()
+
+        if pid == 0:
+            status = 0
+            try:
+                self.run_worker(slot, ready_fd)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                # never return into the parent's stack
+                os._exit(status)
+
+        self.workers[pid] = slot
+        return pid
+
+    def spawn_all(self):
+        """
+        Forks the workers and waits until each has warmed up.
+        """
+        read_fd, write_fd = os.pipe()
+
+        for slot in range(self.worker_count):
+            self.spawn(slot, write_fd)
+        os.close(write_fd)
+
+        ready = 0
+        deadline = time.monotonic() + 60
+        while ready < self.worker_count and time.monotonic() < deadline:
+            readable, _, _ = select.select([read_fd], [], [], 1)
+            if readable:
+                data = os.read(read_fd, self.worker_count)
+                if not data:
+                    break
+                ready += len(data)
+        os.close(read_fd)
+
+        return ready
+
+    # parent side
+
+    def report(self):
+        for pid, slot in sorted(self.workers.items(), key=lambda item: item[1]):
+            self.log(f"worker {slot} (pid {pid}): {self.requests[slot]} requests")
+        self.log(f"total: {sum(self.requests)} requests")
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            slot = self.workers.pop(pid, None)
+            if slot is not None and not self._stopping:
+                self.log(f"worker {slot} (pid {pid}) exited with status {status}, restarting")
+                self.spawn(slot)
+
+    def stop_workers(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def wait_for(self, pids):
+        pids = set(pids)
+        deadline = time.monotonic() + self.graceful_timeout
+
+        while pids and time.monotonic() < deadline:
+            for pid in list(pids):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    pids.discard(pid)
+            time.sleep(0.05)
+
+        for pid in pids:
+            # still busy after graceful_timeout
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+    def reload(self):
+        self.report()
+        self.log("reloading")
+        os.environ[LISTEN_FD_ENV] = str(self.listener.fileno())
+        os.environ[OLD_WORKERS_ENV] = ",".join(str(pid) for pid in self.workers)
+        # the workers become the children of the new image, which keeps the pid
+        os.execv(sys.executable, [sys.executable, *self.argv])
+
+    def _handle(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self._reloading = True
+        elif signum == signal.SIGUSR1:
+            self._reporting = True
+        else:
+            self._stopping = True
+
+    def serve(self):
+        self.listener = self.listen()
+        old_workers = [int(pid) for pid in filter(None, os.environ.pop(OLD_WORKERS_ENV, "").split(","))]
+
+        # shared copy-on-write by the workers; they open their own DB
+        # connections and hashing processes
+        prewarm(start_pool=False)
+        connections.close_all()
+
+        for signum in (signal.SIGHUP, signal.SIGUSR1, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._handle)
+
+        ready = self.spawn_all()
+        host, port = self.listener.getsockname()[:2]
+        self.log(f"{ready}/{self.worker_count} workers serving on {host}:{port}")
+
+        if old_workers:
+            self.stop_workers(old_workers)
+            self.wait_for(old_workers)
+
+        while not self._stopping:
+            time.sleep(0.2)
+            self.reap()
+
+            if self._reporting:
+                self._reporting = False
+                self.report()
+
+            if self._reloading:
+                self.reload()
+
+        self.log("shutting down")
+        pids = list(self.workers)
+        self.stop_workers(pids)
+        self.wait_for(pids)
+        self.report()
+        self.listener.close()
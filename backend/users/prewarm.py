@@ -0,0 +1,77 @@
+"""
+Boot-time warm-up (AUTH_PREWARM).
+
+A fresh worker imports the URLconf, compiles its patterns, sets up the JWT
+signing key and algorithm, loads the password hashers and validators,
+builds the revocation index and starts the hashing processes on its first
+requests, which then pay for all of it. prewarm() does that work when the
+application loads instead; full_auth.wsgi, full_auth.asgi and serve_auth
+call it.
+"""
+
+import logging
+import time
+
+from django.contrib.auth import hashers, password_validation
+from django.db import DatabaseError
+from django.urls import get_resolver
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .hashing import hashing_pool
+from .revocation import revocation_index
+
+
+logger = logging.getLogger(__name__)
+
+
+def _compile(patterns):
+    for pattern in patterns:
+        pattern.pattern.regex
+        if hasattr(pattern, "url_patterns"):
+            _compile(pattern.url_patterns)
+
+
+def warm_urls():
+    resolver = get_resolver()
+    _compile(resolver.url_patterns)
+    resolver.reverse_dict
+
+
+def warm_tokens():
+    token = AccessToken()
+    token[api_settings.USER_ID_CLAIM] = 0
+    AccessToken(str(token))
+
+
+def warm_hashers():
+    hashers.get_hashers()
+    password_validation.get_default_password_validators()
+
+
+def warm_caches():
+    try:
+        revocation_index.refresh()
+    except DatabaseError as e:
+        # the index is built on first use instead
+        logger.warning("Could not load the revocation index: %s", e)
+
+
+def prewarm(start_pool=True):
+    """
+    Returns the seconds spent on each step. A parent that forks its workers
+    passes start_pool=False and lets each worker start its own hashing
+    processes.
+    """
+    steps = [("urls", warm_urls), ("tokens", warm_tokens), ("hashers", warm_hashers), ("caches", warm_caches)]
+    if start_pool:
+        steps.append(("pool", hashing_pool.prewarm))
+
+    timings = {}
+
+    for name, step in steps:
+        started_at = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started_at
+
+    return timings
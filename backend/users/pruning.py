@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+logger = logging.getLogger(__name__)
+
+
+def prune_expired_tokens(batch_size=1000, time_budget=None, now=None):
+    """
+    Deletes expired OutstandingToken rows, and their BlacklistedToken rows,
+    in primary-key windows of batch_size so no single statement holds the
+    database for long. Stops early once time_budget seconds have passed;
+    the next run picks up from the lowest remaining id.
+
+    Refresh tokens share one lifetime, so they expire in id order: the walk
+    starts at the lowest id and stops at the first window without expired
+    rows. Every step is a primary-key seek; expired rows behind a live one
+    (after REFRESH_TOKEN_LIFETIME was shortened) wait until it expires too.
+
+    Returns the number of outstanding tokens deleted.
+    """
+    now = now or timezone.now()
+    started = time.monotonic()
+    deleted = 0
+
+    first = OutstandingToken.objects.order_by("id").values("id").first()
+
+    while first is not None:
+        low = first["id"]
+        high = low + batch_size - 1
+
+        with transaction.atomic():
+            expired = OutstandingToken.objects.filter(id__range=(low, high), expires_at__lte=now)
+            BlacklistedToken.objects.filter(token__in=expired.values("id")).delete()
+            count = expired.delete()[0]
+
+        if not count:
+            break
+        deleted += count
+
+        if time_budget is not None and time.monotonic() - started >= time_budget:
+            break
+
+        # skips gaps in the id sequence instead of walking them window by window
+        first = OutstandingToken.objects.filter(id__gt=high).order_by("id").values("id").first()
+
+    return deleted
+
+
+class PruneScheduler:
+    """
+    Runs a time-boxed prune_expired_tokens() pass on a background thread at
+    most once every interval seconds per process. Hooked to request_finished
+    when AUTH_TOKEN_PRUNE_INTERVAL is set, so no external scheduler is needed.
+    """
+
+    def __init__(self, interval, batch_size=1000, time_budget=1.0):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self._next_run = time.monotonic() + interval
+        self._lock = threading.Lock()
+        self._running = False
+
+    def maybe_run(self, **kwargs):
+        if time.monotonic() < self._next_run:
+            return
+
+        with self._lock:
+            if self._running or time.monotonic() < self._next_run:
+                return
+            self._running = True
+            self._next_run = time.monotonic() + self.interval
+
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        from django.db import connection
+
+        try:
+            deleted = prune_expired_tokens(self.batch_size, self.time_budget)
+            if deleted:
+                logger.info("Pruned %d expired tokens", deleted)
+        except Exception:
+            logger.exception("Pruning expired tokens failed")
+        finally:
+            connection.close()
+            self._running = False
+
+
+prune_scheduler = None
+
+if getattr(settings, "AUTH_TOKEN_PRUNE_INTERVAL", None):
+    prune_scheduler = PruneScheduler(
+        settings.AUTH_TOKEN_PRUNE_INTERVAL,
+        batch_size=getattr(settings, "AUTH_TOKEN_PRUNE_BATCH_SIZE", 1000),
+        time_budget=getattr(settings, "AUTH_TOKEN_PRUNE_TIME_BUDGET", 1.0),
+    )
@@ -0,0 +1,114 @@
+"""
+Transparent access-token renewal (AUTH_ACCESS_RENEWAL).
+
+When a request authenticates with an access cookie that expires within
+AUTH_ACCESS_RENEW_WITHIN seconds, or has already expired or been dropped
+by the browser, CustomJWTAuthentication mints a new access token from the
+refresh cookie. AccessRenewalMiddleware then sets it as the access cookie
+on the response. Clients never see the 401 / refresh / retry cycle.
+"""
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework_simplejwt.exceptions import TokenError
+
+from .epochs import token_epochs
+from .families import token_families
+from .tokens import AsyncRefreshToken, CustomRefreshToken
+
+
+ATTRIBUTE = "renewed_access_token"
+
+
+def renewal_enabled():
+    return getattr(settings, "AUTH_ACCESS_RENEWAL", False)
+
+
+def needs_renewal(validated_token):
+    remaining = validated_token.get("exp", 0) - time.time()
+    return remaining < getattr(settings, "AUTH_ACCESS_RENEW_WITHIN", 60)
+
+
+def _remember(request, access):
+    # DRF's Request wraps the HttpRequest the middleware sees
+    setattr(getattr(request, "_request", request), ATTRIBUTE, str(access))
+    return access
+
+
+def renew_access(request):
+    """
+    Returns a new AccessToken from a valid refresh cookie, or None.
+    """
+    raw_refresh = request.COOKIES.get(settings.AUTH_COOKIE_REFRESH_KEY)
+    if not raw_refresh:
+        return None
+
+    try:
+        refresh = CustomRefreshToken(raw_refresh)
+        token_epochs.check(refresh)
+        token_families.check(refresh)
+    except TokenError:
+        return None
+
+    return _remember(request, refresh.access_token)
+
+
+async def arenew_access(request):
+    raw_refresh = request.COOKIES.get(settings.AUTH_COOKIE_REFRESH_KEY)
+    if not raw_refresh:
+        return None
+
+    try:
+        refresh = AsyncRefreshToken(raw_refresh)
+        await refresh.acheck_blacklist()
+        await token_epochs.acheck(refresh)
+        await token_families.acheck(refresh)
+    except TokenError:
+        return None
+
+    return _remember(request, await refresh.aaccess_token())
+
+
+class AccessRenewalMiddleware:
+    """
+    Sets the access cookie renewed during authentication on the response.
+    Removed from the chain unless AUTH_ACCESS_RENEWAL is set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not renewal_enabled():
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        return self.finish(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.finish(request, await self.get_response(request))
+
+    def finish(self, request, response):
+        # users.views imports DRF views, which import the authentication
+        # classes, which import this module
+        from .views import set_cookie_internal
+
+        token = getattr(request, ATTRIBUTE, None)
+
+        # views that set or delete the cookie themselves (login, logout) win
+        if token is not None and settings.AUTH_COOKIE_ACCESS_KEY not in response.cookies:
+            set_cookie_internal(response, settings.AUTH_COOKIE_ACCESS_KEY, {"access": token})
+
+        return response
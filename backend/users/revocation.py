@@ -0,0 +1,296 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class RevocationIndex:
+    """
+    In-memory index of blacklisted token jtis in front of the token_blacklist
+    tables.
+
+    A Bloom filter answers "not revoked" without touching the database; an
+    exact set of recently blacklisted jtis answers "revoked". Anything else
+    (a filter hit) is checked against BlacklistedToken, which stays the source
+    of truth. The index is built on first use, updated by the post_save signal
+    on BlacklistedToken and polled for rows written by other processes every
+    poll_interval seconds. A full rebuild every rebuild_interval seconds picks
+    up rows whose ids were committed out of order and drops flushed ones; it
+    runs in a background thread while requests keep using the old filter,
+    and jtis added meanwhile are merged into the new one before the swap.
+    """
+
+    def __init__(self, capacity=100_000, error_rate=0.01, recent_size=10_000,
+                 poll_interval=2, rebuild_interval=300):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.recent_size = recent_size
+        self.poll_interval = poll_interval
+        self.rebuild_interval = rebuild_interval
+        self.negatives = 0
+        self.positives = 0
+        self.db_checks = 0
+        self.rebuilds = 0
+        self._bloom = None
+        self._recent = OrderedDict()
+        self._count = 0
+        self._last_id = 0
+        self._last_poll = 0.0
+        self._last_rebuild = 0.0
+        self._added_during_rebuild = None
+        self._rebuilding = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._bloom = None
+            self._recent.clear()
+            self._count = 0
+            self._last_id = 0
+            self._last_poll = 0.0
+            self._last_rebuild = 0.0
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is None:
+                # not built yet; the first refresh() will load it from the DB
+                if self._added_during_rebuild is not None:
+                    self._added_during_rebuild.append(jti)
+                return
+            self._add(jti)
+
+    def _add(self, jti):
+        if self._added_during_rebuild is not None:
+            # the rebuild's query may have run before this row was committed
+            self._added_during_rebuild.append(jti)
+
+        if jti in self._recent:
+            self._recent.move_to_end(jti)
+            return
+
+        self._bloom.add(jti)
+        self._count += 1
+        self._recent[jti] = None
+        self._recent.move_to_end(jti)
+
+        while len(self._recent) > self.recent_size:
+            self._recent.popitem(last=False)
+
+    def _queryset(self):
+        return BlacklistedToken.objects.order_by("id").values_list("id", "token__jti")
+
+    def _rebuild_due(self):
+        return (
+            self._count > self.capacity
+            or time.monotonic() - self._last_rebuild >= self.rebuild_interval
+        )
+
+    def _poll_query(self):
+        """
+        Returns the queryset of rows added since the last poll, or None if the
+        index is fresh enough. Starts a background rebuild when one is due.
+        """
+        if self._rebuild_due():
+            self.start_rebuild()
+
+        if time.monotonic() - self._last_poll < self.poll_interval:
+            return None
+
+        return self._queryset().filter(id__gt=self._last_id)
+
+    def _apply(self, rows):
+        with self._lock:
+            for row_id, jti in rows:
+                self._add(jti)
+                self._last_id = max(self._last_id, row_id)
+
+            self._last_poll = time.monotonic()
+
+    def _begin_rebuild(self):
+        with self._lock:
+            self._added_during_rebuild = []
+
+    def _finish_rebuild(self, rows):
+        capacity = max(self.capacity, 2 * len(rows))
+        bloom = BloomFilter(capacity, self.error_rate)
+        for _, jti in rows:
+            bloom.add(jti)
+        recent = OrderedDict.fromkeys(jti for _, jti in rows[-self.recent_size:])
+        last_id = max((row_id for row_id, _ in rows), default=0)
+
+        with self._lock:
+            added, self._added_during_rebuild = self._added_during_rebuild or [], None
+            self.capacity = capacity
+            self._bloom = bloom
+            self._recent = recent
+            self._count = len(rows)
+            self._last_id = max(self._last_id, last_id)
+            self._last_rebuild = self._last_poll = time.monotonic()
+            self.rebuilds += 1
+
+            for jti in added:
+                self._add(jti)
+
+    def rebuild(self):
+        """
+        Reloads the whole index from BlacklistedToken.
+        """
+        self._begin_rebuild()
+
+        try:
+            rows = list(self._queryset())
+        except BaseException:
+            with self._lock:
+                self._added_during_rebuild = None
+            raise
+
+        self._finish_rebuild(rows)
+
+    def start_rebuild(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        threading.Thread(target=self._rebuild_in_background, name="revocation-rebuild", daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except DatabaseError as e:
+            logger.warning("Could not rebuild the revocation index: %s", e)
+            # retried after another rebuild_interval, not on every request
+            self._last_rebuild = time.monotonic()
+        finally:
+            self._rebuilding = False
+            connections.close_all()
+
+    def refresh(self):
+        if self._bloom is None:
+            # nothing to answer from yet: build it here, once
+            with self._build_lock:
+                if self._bloom is None:
+                    self.rebuild()
+            return
+
+        queryset = self._poll_query()
+        if queryset is not None:
+            self._apply(list(queryset))
+
+    async def arefresh(self):
+        if self._bloom is None:
+            await sync_to_async(self.refresh)()
+            return
+
+        queryset = self._poll_query()
+        if queryset is not None:
+            self._apply([row async for row in queryset])
+
+    def _lookup(self, jti):
+        with self._lock:
+            if jti in self._recent:
+                self.positives += 1
+                return True
+
+            if jti not in self._bloom:
+                self.negatives += 1
+                return False
+
+            self.db_checks += 1
+            return None
+
+    def is_revoked(self, jti):
+        self.refresh()
+        revoked = self._lookup(jti)
+
+        if revoked is None:
+            revoked = BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+        return revoked
+
+    async def ais_revoked(self, jti):
+        await self.arefresh()
+        revoked = self._lookup(jti)
+
+        if revoked is None:
+            revoked = await BlacklistedToken.objects.filter(token__jti=jti).aexists()
+
+        return revoked
+
+    def revoked_among(self, jtis):
+        """
+        Returns the subset of jtis that are revoked, with at most one query
+        for all the Bloom filter hits.
+        """
+        self.refresh()
+        revoked, unsure = set(), []
+
+        for jti in set(jtis):
+            result = self._lookup(jti)
+            if result:
+                revoked.add(jti)
+            elif result is None:
+                unsure.append(jti)
+
+        if unsure:
+            revoked.update(
+                BlacklistedToken.objects.filter(token__jti__in=unsure)
+                .values_list("token__jti", flat=True)
+            )
+
+        return revoked
+
+    def stats(self):
+        return {
+            "negatives": self.negatives,
+            "positives": self.positives,
+            "db_checks": self.db_checks,
+            "rebuilds": self.rebuilds,
+            "size": self._count,
+            "capacity": self.capacity,
+        }
+
+
+revocation_index = RevocationIndex(
+    capacity=getattr(settings, "AUTH_REVOCATION_CAPACITY", 100_000),
+    error_rate=getattr(settings, "AUTH_REVOCATION_ERROR_RATE", 0.01),
+    poll_interval=getattr(settings, "AUTH_REVOCATION_POLL_INTERVAL", 2),
+    rebuild_interval=getattr(settings, "AUTH_REVOCATION_REBUILD_INTERVAL", 300),
+)
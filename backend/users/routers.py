@@ -0,0 +1,90 @@
+"""
+Read-replica routing for auth lookups.
+
+Only reads made inside a replica_reads() block go to a replica, and only for
+the auth apps; everything else, and every write, uses the primary. Two rules
+keep reads consistent with writes:
+
+* a write inside a block sends the rest of that block to the primary;
+* pin_primary(key) keeps blocks opened with that key on the primary for
+  AUTH_REPLICA_STICKY_SECONDS, across requests. users.signals pins
+  "user:<id>" when a user row changes and "token_blacklist" when a token is
+  blacklisted.
+"""
+
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+REPLICA_APPS = {"users", "auth", "token_blacklist"}
+
+_state = contextvars.ContextVar("auth_replica_reads", default=None)
+
+_pins = {}
+_pins_lock = threading.Lock()
+
+
+def pin_primary(key):
+    with _pins_lock:
+        _pins[key] = time.monotonic() + settings.AUTH_REPLICA_STICKY_SECONDS
+
+
+def is_pinned(key):
+    until = _pins.get(key)
+    if until is None:
+        return False
+
+    if until > time.monotonic():
+        return True
+
+    with _pins_lock:
+        if _pins.get(key) == until:
+            del _pins[key]
+
+    return False
+
+
+@contextmanager
+def replica_reads(*keys):
+    if not settings.DATABASE_REPLICAS or any(is_pinned(key) for key in keys):
+        yield
+        return
+
+    token = _state.set({"wrote": False})
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class AuthReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+
+        if state is None or state["wrote"] or model._meta.app_label not in REPLICA_APPS:
+            return None
+
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+
+        if state is not None:
+            state["wrote"] = True
+
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+
+        return None
@@ -0,0 +1,186 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from djoser.conf import settings as djoser_settings
+from djoser.serializers import SendEmailResetSerializer
+from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+    TokenVerifySerializer
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+
+from .epochs import token_epochs
+from .families import FAMILY_CLAIM, token_families
+from .revocation import revocation_index
+from .routers import replica_reads
+from .token_cache import token_cache
+from .tokens import CustomRefreshToken
+
+
+def current_user_data(user, context=None):
+    """
+    The payload djoser's /users/me/ would return for user.
+    """
+    return djoser_settings.SERIALIZERS.current_user(user, context=context or {}).data
+
+
+class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = CustomRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+
+        if getattr(settings, "AUTH_LOGIN_RETURNS_USER", False):
+            # self.user is the row authenticate() already loaded
+            data["user"] = current_user_data(self.user, self.context)
+
+        return data
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CustomRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        # for the audit trail
+        self.user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        token_epochs.check(refresh)
+
+        if not (token_families.enabled and FAMILY_CLAIM in refresh):
+            try:
+                return super().validate(attrs)
+            except get_user_model().DoesNotExist:
+                raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        if self.user_id:
+            user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: self.user_id}).first()
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        # rotation is a generation bump in the family store, not an
+        # OutstandingToken + BlacklistedToken insert
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+        token_families.rotate(refresh)
+
+        return {"access": str(refresh.access_token), "refresh": str(refresh)}
+
+
+class CustomTokenVerifySerializer(TokenVerifySerializer):
+    def validate(self, attrs):
+        token = UntypedToken(attrs["token"])
+
+        if not (token_epochs.is_current(token) and token_families.is_current(token)):
+            raise ValidationError(_("Token has been revoked"))
+
+        if api_settings.BLACKLIST_AFTER_ROTATION:
+            with replica_reads("token_blacklist"):
+                revoked = revocation_index.is_revoked(token.get(api_settings.JTI_CLAIM))
+
+            if revoked:
+                raise ValidationError(_("Token is blacklisted"))
+
+        return {}
+
+
+class TokenBatchVerifySerializer(serializers.Serializer):
+    tokens = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=getattr(settings, "AUTH_VERIFY_BATCH_MAX_TOKENS", 100),
+        write_only=True,
+    )
+
+    def decode(self, raw_token):
+        # access tokens already validated by CustomJWTAuthentication skip decoding
+        token = token_cache.get(raw_token)
+        if token is None:
+            token = UntypedToken(raw_token)
+        return token
+
+    def validate(self, attrs):
+        decoded = {}
+
+        for raw_token in attrs["tokens"]:
+            if raw_token in decoded:
+                continue
+            try:
+                decoded[raw_token] = self.decode(raw_token)
+            except TokenError as e:
+                decoded[raw_token] = e
+
+        revoked = set()
+        if api_settings.BLACKLIST_AFTER_ROTATION:
+            with replica_reads("token_blacklist"):
+                revoked = revocation_index.revoked_among(
+                    token.get(api_settings.JTI_CLAIM)
+                    for token in decoded.values() if not isinstance(token, TokenError)
+                )
+
+        results = []
+        for raw_token in attrs["tokens"]:
+            token = decoded[raw_token]
+
+            if isinstance(token, TokenError):
+                results.append({"valid": False, "detail": str(token.args[0])})
+            elif token.get(api_settings.JTI_CLAIM) in revoked:
+                results.append({"valid": False, "detail": str(_("Token is blacklisted"))})
+            elif not (token_epochs.is_current(token) and token_families.is_current(token)):
+                results.append({"valid": False, "detail": str(_("Token has been revoked"))})
+            else:
+                results.append({
+                    "valid": True,
+                    "token_type": token.get(api_settings.TOKEN_TYPE_CLAIM),
+                    "exp": token.get("exp"),
+                    "user_id": token.get(api_settings.USER_ID_CLAIM),
+                })
+
+        return {"results": results}
+
+
+class UserApproveSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    email_domain = serializers.CharField(required=False)
+    all_pending = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        if not (attrs.get("ids") or attrs.get("email_domain") or attrs["all_pending"]):
+            raise ValidationError(_("Give ids, email_domain or all_pending to select users."))
+        return attrs
+
+    def get_queryset(self, queryset):
+        if "ids" in self.validated_data:
+            queryset = queryset.filter(pk__in=self.validated_data["ids"])
+        if "email_domain" in self.validated_data:
+            queryset = queryset.filter(email__iendswith="@" + self.validated_data["email_domain"].lstrip("@"))
+        return queryset
+
+
+class CaseInsensitiveEmailResetSerializer(SendEmailResetSerializer):
+    """
+    djoser's reset-password / resend-activation serializer, with the user
+    found through the Lower(email) indexes instead of an exact match.
+    """
+
+    def get_user(self, is_active=True):
+        User = get_user_model()
+        try:
+            user = User._default_manager.get_by_email(
+                self.data.get(self.email_field, ""), is_active=is_active,
+            )
+            if user.has_usable_password():
+                return user
+        except User.DoesNotExist:
+            pass
+
+        if (
+            djoser_settings.PASSWORD_RESET_SHOW_EMAIL_NOT_FOUND
+            or djoser_settings.USERNAME_RESET_SHOW_EMAIL_NOT_FOUND
+        ):
+            self.fail("email_not_found")
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.core.signals import request_finished
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .families import token_families
+from .models import UserAccount
+from .permission_cache import permission_cache
+from .pruning import prune_scheduler
+from .revocation import revocation_index
+from .routers import pin_primary
+from .user_cache import user_cache
+
+
+@receiver([post_save, post_delete], sender=UserAccount)
+def invalidate_user_snapshot(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+    # is_active and is_superuser feed into the permission set too
+    permission_cache.invalidate(instance.pk)
+    pin_primary(f"user:{instance.pk}")
+
+
+@receiver(m2m_changed, sender=UserAccount.groups.through)
+@receiver(m2m_changed, sender=UserAccount.user_permissions.through)
+def invalidate_user_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+
+    if not reverse:
+        user_cache.invalidate(instance.pk)
+        permission_cache.invalidate(instance.pk)
+    elif pk_set:
+        # changed from the group/permission side, pk_set holds user ids
+        for user_id in pk_set:
+            user_cache.invalidate(user_id)
+            permission_cache.invalidate(user_id)
+    else:
+        user_cache.clear()
+        permission_cache.clear()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=Permission)
+def invalidate_all_snapshots(sender, **kwargs):
+    # a group or permission change can affect any number of users
+    user_cache.clear()
+    permission_cache.clear()
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def index_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        pin_primary("token_blacklist")
+        jti = instance.token.jti
+        transaction.on_commit(lambda: revocation_index.add(jti))
+
+
+if prune_scheduler is not None:
+    request_finished.connect(prune_scheduler.maybe_run, dispatch_uid="users.prune_tokens")
+
+if token_families.enabled:
+    request_finished.connect(token_families.maybe_snapshot, dispatch_uid="users.token_families")
@@ -1,3 +1,1276 @@
-from django.test import TestCase
+import asyncio
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.contrib.auth.models import Group, Permission
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .async_views import AsyncCustomTokenObtainPairView, AsyncCustomTokenRefreshView, AsyncLogoutAllView
+from .audit import AuditLog, FileSink, audit_log
+from .authentication import CustomJWTAuthentication
+from .db_backends.sqlite3.base import DatabaseWrapper as TunedDatabaseWrapper
+from .epochs import EPOCH_CLAIM, check_epochs_cache, token_epochs
+from .families import token_families
+from .hashing import hashing_pool
+from .importing import UserImporter
+from .mail import claim_batch, drain_queue
+from .models import AuditEvent, OutgoingEmail, TokenFamily, UserAccount
+from .permission_cache import permission_cache
+from .pruning import prune_expired_tokens
+from .revocation import revocation_index
+from .routers import AuthReplicaRouter, pin_primary, replica_reads
+from .throttling import bucket_store
+from .timing import histograms
+from .token_cache import TokenCache, token_cache
+from .tokens import CustomRefreshToken
+from .user_cache import UserCache, user_cache
+from .views import CustomTokenObtainPairView, TokenBatchVerifyView, UserApproveView, metrics_view
+
+
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user(
+            email="Jane@Example.com", password="secret-pass-123",
+            first_name="Jane", last_name="Doe", is_active=True,
+        )
+        token_cache.clear()
+        user_cache.clear()
+
+    def authenticate(self, raw_token):
+        request = APIRequestFactory().get("/")
+        request.COOKIES[settings.AUTH_COOKIE_ACCESS_KEY] = raw_token
+        return CustomJWTAuthentication().authenticate(request)
+
+    def test_second_request_hits_cache(self):
+        raw_token = str(AccessToken.for_user(self.user))
+
+        self.assertEqual(self.authenticate(raw_token)[0], self.user)
+        self.assertEqual(self.authenticate(raw_token)[0], self.user)
+        self.assertEqual(token_cache.stats()["hits"], 1)
+        self.assertEqual(token_cache.stats()["misses"], 1)
+
+    def test_expired_entry_is_not_served(self):
+        cache = TokenCache(maxsize=4)
+        token = AccessToken.for_user(self.user)
+        cache.set("raw", token)
+
+        with mock.patch("users.token_cache.time.time", return_value=token["exp"] + 1):
+            self.assertIsNone(cache.get("raw"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_cached_token_is_still_checked_for_revocation(self):
+        raw_token = str(AccessToken.for_user(self.user))
+        self.authenticate(raw_token)
+
+        with mock.patch.object(token_epochs, "alias", "default"):
+            token_epochs.bump(self.user.pk)
+            self.addCleanup(cache.clear)
+
+            self.assertIsNone(self.authenticate(raw_token))
+        self.assertEqual(token_cache.stats()["hits"], 1)
+
+    def test_lru_eviction(self):
+        cache = TokenCache(maxsize=2)
+        for raw in ("a", "b", "c"):
+            cache.set(raw, AccessToken.for_user(self.user))
+
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.stats()["size"], 2)
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user(
+            email="john@example.com", password="secret-pass-123",
+            first_name="John", last_name="Doe", is_active=True,
+        )
+        self.raw_token = str(AccessToken.for_user(self.user))
+        token_cache.clear()
+        user_cache.clear()
+
+    def authenticate(self):
+        request = APIRequestFactory().get("/")
+        request.COOKIES[settings.AUTH_COOKIE_ACCESS_KEY] = self.raw_token
+        return CustomJWTAuthentication().authenticate(request)
+
+    def test_seen_user_needs_no_query(self):
+        self.authenticate()
+
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertEqual(user, self.user)
+
+    def test_save_invalidates_snapshot(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(self.authenticate())
+
+    def test_group_change_invalidates_snapshot(self):
+        self.authenticate()
+        self.user.groups.add(Group.objects.create(name="staff"))
+
+        self.assertIsNone(user_cache.get(self.user.pk))
+
+    def test_invalidation_reaches_other_workers_through_shared_tier(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # two workers sharing one cache backend
+        this, other = UserCache(backend="default"), UserCache(backend="default")
+        this.set(self.user.pk, self.user)
+        self.assertEqual(other.get(self.user.pk), self.user)
+
+        this.invalidate(self.user.pk)
+
+        self.assertIsNone(other.get(self.user.pk))
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user(
+            email="async@example.com", password="secret-pass-123",
+            first_name="Async", last_name="User", is_active=True,
+        )
+        token_cache.clear()
+        user_cache.clear()
+        bucket_store.clear()
+
+    async def login(self, password):
+        request = AsyncRequestFactory().post(
+            "/api/jwt/create/",
+            {"email": "async@example.com", "password": password},
+            content_type="application/json",
+        )
+        return await AsyncCustomTokenObtainPairView.as_view()(request)
+
+    async def test_login_sets_cookies(self):
+        response = await self.login("secret-pass-123")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(settings.AUTH_COOKIE_ACCESS_KEY, response.cookies)
+        self.assertIn(settings.AUTH_COOKIE_REFRESH_KEY, response.cookies)
+
+    async def test_login_rejects_bad_password(self):
+        response = await self.login("wrong")
+
+        self.assertEqual(response.status_code, 401)
+
+    async def test_refresh_from_cookie(self):
+        login = await self.login("secret-pass-123")
+        request = AsyncRequestFactory().post("/api/jwt/refresh/", {}, content_type="application/json")
+        request.COOKIES[settings.AUTH_COOKIE_REFRESH_KEY] = login.cookies[settings.AUTH_COOKIE_REFRESH_KEY].value
+
+        response = await AsyncCustomTokenRefreshView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(settings.AUTH_COOKIE_ACCESS_KEY, response.cookies)
+
+    async def test_unknown_email_does_not_block_the_loop(self):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.001)
+                ticks += 1
+
+        request = AsyncRequestFactory().post(
+            "/api/jwt/create/", {"email": "nobody@example.com", "password": "secret-pass-123"},
+            content_type="application/json",
+        )
+        task = asyncio.ensure_future(ticker())
+        with mock.patch.object(hashing_pool, "run", side_effect=AssertionError("blocking hash")):
+            response = await AsyncCustomTokenObtainPairView.as_view()(request)
+        task.cancel()
+
+        self.assertEqual(response.status_code, 401)
+        self.assertGreater(ticks, 0)
+
+    async def test_refresh_rejects_deleted_user(self):
+        login = await self.login("secret-pass-123")
+        refresh = login.cookies[settings.AUTH_COOKIE_REFRESH_KEY].value
+        await UserAccount.objects.filter(pk=self.user.pk).adelete()
+
+        request = AsyncRequestFactory().post("/api/jwt/refresh/", {}, content_type="application/json")
+        request.COOKIES[settings.AUTH_COOKIE_REFRESH_KEY] = refresh
+        response = await AsyncCustomTokenRefreshView.as_view()(request)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.content)["code"], "no_active_account")
+        self.assertNotIn(settings.AUTH_COOKIE_ACCESS_KEY, response.cookies)
+
+    @override_settings(AUTH_LOGIN_RETURNS_USER=True)
+    async def test_login_returns_user(self):
+        response = await self.login("secret-pass-123")
+
+        self.assertEqual(json.loads(response.content)["user"]["email"], "async@example.com")
+
+    async def test_aauthenticate(self):
+        login = await self.login("secret-pass-123")
+        request = AsyncRequestFactory().get("/")
+        request.COOKIES[settings.AUTH_COOKIE_ACCESS_KEY] = login.cookies[settings.AUTH_COOKIE_ACCESS_KEY].value
+
+        user, _ = await CustomJWTAuthentication().aauthenticate(request)
+
+        self.assertEqual(user.pk, self.user.pk)
+
+
+class PasswordHashingPoolTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user(
+            email="hash@example.com", password="secret-pass-123",
+            first_name="Hash", last_name="User", is_active=True,
+        )
+        bucket_store.clear()
+
+    def login(self):
+        request = APIRequestFactory().post(
+            "/api/jwt/create/",
+            {"email": "hash@example.com", "password": "secret-pass-123"},
+            format="json",
+        )
+        return CustomTokenObtainPairView.as_view()(request)
+
+    def test_login_verifies_on_pool(self):
+        completed = hashing_pool.stats()["completed"]
+
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(hashing_pool.stats()["completed"], completed + 1)
+        self.assertTrue(self.user.check_password("secret-pass-123"))
+
+    def test_full_queue_fails_fast_with_503(self):
+        with mock.patch.object(hashing_pool, "max_pending", 0):
+            response = self.login()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data["detail"].code, "hashing_unavailable")
+
+
+class RevocationIndexTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user(
+            email="revoke@example.com", password="secret-pass-123",
+            first_name="Re", last_name="Voke", is_active=True,
+        )
+        revocation_index.reset()
+
+    def test_not_revoked_answered_from_memory(self):
+        refresh = CustomRefreshToken.for_user(self.user)
+        revocation_index.refresh()
+
+        with self.assertNumQueries(0):
+            CustomRefreshToken(str(refresh))
+
+    def test_blacklisted_token_is_rejected(self):
+        refresh = CustomRefreshToken.for_user(self.user)
+        revocation_index.refresh()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh.blacklist()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(revocation_index.is_revoked(refresh["jti"]))
+
+    def test_rebuild_loads_existing_rows(self):
+        refresh = CustomRefreshToken.for_user(self.user)
+        refresh.blacklist()
+
+        self.assertTrue(revocation_index.is_revoked(refresh["jti"]))
+        self.assertFalse(revocation_index.is_revoked("unknown-jti"))
+
+    def test_jti_added_during_rebuild_is_kept(self):
+        revocation_index.refresh()
+
+        revocation_index._begin_rebuild()
+        # committed after the rebuild's query ran
+        revocation_index.add("late-jti")
+        revocation_index._finish_rebuild([])
+
+        with self.assertNumQueries(0):
+            self.assertTrue(revocation_index.is_revoked("late-jti"))
+
+    def test_periodic_rebuild_is_off_the_request_path(self):
+        revocation_index.refresh()
+
+        with mock.patch.object(revocation_index, "rebuild_interval", 0), \
+                mock.patch.object(revocation_index, "start_rebuild") as start_rebuild, \
+                mock.patch.object(revocation_index, "rebuild") as rebuild:
+            revocation_index.is_revoked("unknown-jti")
+
+        start_rebuild.assert_called_once_with()
+        rebuild.assert_not_called()
+
+
+class TokenBatchVerifyTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user(
+            email="batch@example.com", password="secret-pass-123",
+            first_name="Batch", last_name="User", is_active=True,
+        )
+        revocation_index.reset()
+
+    def verify(self, tokens):
+        request = APIRequestFactory().post("/api/jwt/verify/batch/", {"tokens": tokens}, format="json")
+        return TokenBatchVerifyView.as_view()(request)
+
+    @mock.patch.object(api_settings, "BLACKLIST_AFTER_ROTATION", True)
+    def test_results_in_request_order(self):
+        refresh = CustomRefreshToken.for_user(self.user)
+        revoked = CustomRefreshToken.for_user(self.user)
+        revoked.blacklist()
+
+        response = self.verify([str(refresh.access_token), "garbage", str(revoked), str(refresh)])
+        results = response.data["results"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["valid"] for result in results], [True, False, False, True])
+        self.assertEqual(results[0]["user_id"], str(self.user.pk))
+        self.assertEqual(results[3]["token_type"], "refresh")
+        self.assertEqual(results[0]["exp"], refresh.access_token["exp"])
+
+    def test_batch_size_is_limited(self):
+        response = self.verify(["token"] * (settings.AUTH_VERIFY_BATCH_MAX_TOKENS + 1))
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TimingTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user(
+            email="timing@example.com", password="secret-pass-123",
+            first_name="Tim", last_name="Ing", is_active=True,
+        )
+        self.client.cookies[settings.AUTH_COOKIE_ACCESS_KEY] = str(AccessToken.for_user(self.user))
+        token_cache.clear()
+        user_cache.clear()
+        histograms.clear()
+
+    def test_no_header_by_default(self):
+        response = self.client.get("/api/users/me/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(AUTH_SERVER_TIMING_HEADER=True, AUTH_TIMING_ENABLED=True)
+    def test_phases_in_header_and_histograms(self):
+        response = self.client.get("/api/users/me/")
+        phases = [entry.split(";")[0] for entry in response["Server-Timing"].split(", ")]
+
+        for name in ("auth_cookie", "auth_token_decode", "auth_user", "total"):
+            self.assertIn(name, phases)
+        self.assertIn('auth_phase_seconds_count{phase="auth_user"}', histograms.render())
+
+    def test_metrics_restricted_to_internal_ips(self):
+        request = RequestFactory().get("/api/metrics/", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(metrics_view(request).status_code, 403)
+
+        request = RequestFactory().get("/api/metrics/", REMOTE_ADDR="127.0.0.1")
+        self.assertIn(b"auth_token_cache_hits", metrics_view(request).content)
+
+
+class PruneTokensTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        for i in range(5):
+            token = OutstandingToken.objects.create(
+                jti=f"expired-{i}", token="", expires_at=now - timedelta(days=1)
+            )
+            BlacklistedToken.objects.create(token=token)
+        OutstandingToken.objects.create(jti="live", token="", expires_at=now + timedelta(days=1))
+
+    def test_prunes_expired_in_batches(self):
+        self.assertEqual(prune_expired_tokens(batch_size=2), 5)
+        self.assertEqual(list(OutstandingToken.objects.values_list("jti", flat=True)), ["live"])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    def test_time_budget_stops_early(self):
+        self.assertEqual(prune_expired_tokens(batch_size=2, time_budget=0), 2)
+        self.assertEqual(prune_expired_tokens(batch_size=2), 3)
+
+    def test_stops_at_first_window_without_expired_rows(self):
+        OutstandingToken.objects.filter(jti="expired-4").delete()
+        OutstandingToken.objects.create(jti="expired-late", token="", expires_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(prune_expired_tokens(batch_size=1), 4)
+        self.assertEqual(
+            sorted(OutstandingToken.objects.values_list("jti", flat=True)), ["expired-late", "live"],
+        )
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        bucket_store.clear()
+
+    def login(self, email, **extra):
+        request = APIRequestFactory().post(
+            "/api/jwt/create/", {"email": email, "password": "wrong"}, format="json", **extra
+        )
+        return CustomTokenObtainPairView.as_view()(request)
+
+    @override_settings(AUTH_THROTTLE_RATES={"login_email": "2/min"})
+    def test_login_throttled_per_email_before_db(self):
+        self.assertEqual(self.login("a@example.com").status_code, 401)
+        self.assertEqual(self.login("A@example.com").status_code, 401)
+
+        with self.assertNumQueries(0):
+            response = self.login("a@example.com")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.login("b@example.com").status_code, 401)
+
+    @override_settings(AUTH_THROTTLE_RATES={"login_ip": "1/min"})
+    def test_login_throttled_per_ip(self):
+        self.login("a@example.com")
+
+        self.assertEqual(self.login("b@example.com").status_code, 429)
+
+    @override_settings(AUTH_THROTTLE_RATES={"login_ip": "1/min"})
+    def test_forwarded_for_ignored_without_num_proxies(self):
+        self.login("a@example.com", HTTP_X_FORWARDED_FOR="198.51.100.1")
+
+        response = self.login("b@example.com", HTTP_X_FORWARDED_FOR="198.51.100.2")
+        self.assertEqual(response.status_code, 429)
+
+        with mock.patch("users.throttling.api_settings.NUM_PROXIES", 1):
+            response = self.login("c@example.com", HTTP_X_FORWARDED_FOR="198.51.100.3")
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(AUTH_THROTTLE_RATES={"password_reset_email": "1/hour"})
+    def test_djoser_reset_password_throttled(self):
+        self.client.post("/api/users/reset_password/", {"email": "a@example.com"})
+        response = self.client.post("/api/users/reset_password/", {"email": "a@example.com"})
+
+        self.assertEqual(response.status_code, 429)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class ReplicaRouterTests(TestCase):
+    router = AuthReplicaRouter()
+
+    def test_reads_outside_block_use_primary(self):
+        self.assertIsNone(self.router.db_for_read(UserAccount))
+
+    def test_auth_reads_in_block_use_replica(self):
+        with replica_reads("user:unpinned"):
+            self.assertEqual(self.router.db_for_read(UserAccount), "replica_0")
+            self.assertIsNone(self.router.db_for_read(Session))
+
+    def test_write_sticks_block_to_primary(self):
+        with replica_reads("user:unpinned"):
+            self.assertEqual(self.router.db_for_write(UserAccount), "default")
+            self.assertIsNone(self.router.db_for_read(UserAccount))
+
+    def test_pinned_key_reads_from_primary(self):
+        pin_primary("user:pinned")
+
+        with replica_reads("user:pinned"):
+            self.assertIsNone(self.router.db_for_read(UserAccount))
+
+
+class ImportUsersTests(TestCase):
+    def test_import_normalizes_and_skips_duplicates(self):
+        UserAccount.objects.create_user(email="taken@example.com", password=None)
+        UserAccount.objects.create_user(email="Mixed.Case@example.com", password=None)
+        rows = [
+            {"email": "New@Example.COM", "password": "secret-pass-123", "first_name": "New"},
+            {"email": "new@example.com", "password": "other-pass"},
+            {"email": "Taken@example.com", "password": "secret-pass-123"},
+            {"email": "not-an-email"},
+            {"email": "nopass@example.com"},
+            {"email": "mixed.case@example.com"},
+        ]
+
+        stats = UserImporter(batch_size=2, workers=0).run(rows)
+
+        self.assertEqual(
+            (stats["read"], stats["created"], stats["duplicates"], stats["invalid"]),
+            (6, 2, 3, 1),
+        )
+        user = UserAccount.objects.get(email="new@example.com")
+        self.assertFalse(user.is_active)
+        self.assertTrue(user.check_password("secret-pass-123"))
+        self.assertFalse(UserAccount.objects.get(email="nopass@example.com").has_usable_password())
+
+    def test_conflicting_rows_are_not_counted_as_created(self):
+        importer = UserImporter(batch_size=10, workers=0)
+        importer.started = time.monotonic()
+        users, hashes = importer._prepare([{"email": "a@example.com"}, {"email": "race@example.com"}])
+        # registered between the duplicate check and the insert
+        UserAccount.objects.create_user(email="Race@example.com", password=None)
+
+        importer._write(users, hashes)
+
+        self.assertEqual((importer.created, importer.duplicates), (1, 1))
+        self.assertTrue(UserAccount.objects.filter(email="a@example.com").exists())
+
+    def test_command_reads_ndjson(self):
+        path = os.path.join(tempfile.mkdtemp(), "users.ndjson")
+        with open(path, "w") as f:
+            f.write('{"email": "a@example.com", "first_name": "A"}\n\n{"email": "b@example.com"}\n')
+
+        call_command("import_users", path, "--workers=0", "--active", stdout=mock.Mock(), stderr=mock.Mock())
+
+        self.assertEqual(UserAccount.objects.filter(is_active=True).count(), 2)
+
+
+class UserApprovalTests(TestCase):
+    def setUp(self):
+        self.admin = UserAccount.objects.create_superuser(email="admin@example.com", password=None)
+        self.pending = [
+            UserAccount.objects.create_user(email=f"p{i}@example.com", password=None)
+            for i in range(3)
+        ]
+        UserAccount.objects.create_user(email="p@other.com", password=None)
+
+    def approve(self, data):
+        request = APIRequestFactory().post("/api/approvals/", data, format="json")
+        force_authenticate(request, self.admin)
+        return UserApproveView.as_view()(request)
+
+    def test_approves_filtered_users_with_one_update_and_batched_emails(self):
+        user_cache.set(self.pending[0].pk, self.pending[0])
+
+        with mock.patch("users.approval.get_connection", wraps=mail.get_connection) as get_connection, \
+                self.settings(AUTH_APPROVAL_EMAIL_BATCH_SIZE=2), \
+                self.assertNumQueries(4), \
+                self.captureOnCommitCallbacks(execute=True):
+            # savepoint, select, update, release
+            response = self.approve({"email_domain": "example.com"})
+
+        self.assertEqual(response.data, {"approved": 3})
+        self.assertEqual(UserAccount.objects.filter(is_active=False).count(), 1)
+        self.assertIsNone(user_cache.get(self.pending[0].pk))
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [u.email for u in self.pending])
+
+    def test_approval_refreshes_cached_permissions(self):
+        user = self.pending[0]
+        user.user_permissions.add(Permission.objects.get(codename="view_useraccount"))
+        permission_cache.set(user.pk, frozenset())
+
+        self.approve({"email_domain": "example.com"})
+
+        self.assertIsNone(permission_cache.get(user.pk))
+        self.assertTrue(UserAccount.objects.get(pk=user.pk).has_perm("users.view_useraccount"))
+
+    def test_requires_a_filter(self):
+        self.assertEqual(self.approve({}).status_code, 400)
+
+
+@override_settings(
+    EMAIL_BACKEND="users.mail.QueuedEmailBackend",
+    AUTH_MAIL_DELIVERY_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    AUTH_MAIL_MAX_ATTEMPTS=2,
+)
+class MailQueueTests(TestCase):
+    def test_djoser_mail_is_queued_then_delivered(self):
+        self.client.post("/api/users/", {
+            "email": "queued@example.com", "first_name": "Q", "last_name": "U",
+            "password": "Secret-pass-123!", "re_password": "Secret-pass-123!",
+        })
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+
+        self.assertEqual(drain_queue(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ["queued@example.com"])
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    def test_failed_delivery_backs_off_then_gives_up(self):
+        mail.send_mail("Subject", "Body", None, ["a@example.com"])
+
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=ConnectionError("smtp down"),
+        ), self.assertLogs("users.mail", "WARNING"):
+            self.assertEqual(drain_queue(), (0, 1))
+            row = OutgoingEmail.objects.get()
+            self.assertGreater(row.next_attempt_at, timezone.now())
+            self.assertEqual(drain_queue(), (0, 0))  # not due yet
+
+            OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+            drain_queue()
+
+        row = OutgoingEmail.objects.get()
+        self.assertEqual(row.attempts, 2)
+        self.assertTrue(row.failed)
+        self.assertIn("smtp down", row.last_error)
+
+    def test_envelope_is_queued(self):
+        mail.EmailMessage(
+            "Subject", "Body", None, ["a@example.com"], bcc=["b@example.com"],
+            cc=["c@example.com"], reply_to=["d@example.com"], headers={"X-Tag": "approval"},
+        ).send()
+
+        drain_queue()
+
+        message = mail.outbox[0]
+        self.assertEqual(message.cc, ["c@example.com"])
+        self.assertEqual(message.bcc, ["b@example.com"])
+        self.assertEqual(message.reply_to, ["d@example.com"])
+        self.assertEqual(message.extra_headers, {"X-Tag": "approval"})
+
+    def test_attachments_are_refused(self):
+        message = mail.EmailMessage("Subject", "Body", None, ["a@example.com"])
+        message.attach("report.txt", "data", "text/plain")
+
+        with self.assertRaises(ValueError):
+            message.send()
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    def test_claimed_rows_are_not_claimed_again(self):
+        for i in range(3):
+            mail.send_mail("Subject", "Body", None, [f"{i}@example.com"])
+
+        first, second = claim_batch(2), claim_batch(2)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertEqual(claim_batch(2), [])
+
+
+class EmailLookupTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user(
+            email="case@example.com", password="secret-pass-123", is_active=True,
+        )
+        bucket_store.clear()
+
+    def test_natural_key_lookup_ignores_case(self):
+        self.assertEqual(UserAccount.objects.get_by_natural_key("Case@Example.COM"), self.user)
+
+    def test_login_ignores_email_case(self):
+        response = self.client.post(
+            "/api/jwt/create/", {"email": "CASE@example.com", "password": "secret-pass-123"},
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_reset_password_finds_user_regardless_of_case(self):
+        self.client.post("/api/users/reset_password/", {"email": "Case@Example.com"})
+        self.assertEqual(mail.outbox[0].to, ["case@example.com"])
+
+    def test_lookup_uses_lower_index(self):
+        queryset = UserAccount.objects.filter(UserAccount.objects.email_lookup("case@example.com"), is_active=True)
+        self.assertRegex(queryset.explain(), r"USING INDEX useraccount_(email_lower_uniq|active_email_idx)")
+
+    def test_case_variants_are_unique(self):
+        with self.assertRaises(IntegrityError):
+            UserAccount.objects.create(email="CASE@example.com")
+
+
+class PermissionCacheTests(TestCase):
+    def setUp(self):
+        permission_cache.clear()
+        user_cache.clear()
+        self.user = UserAccount.objects.create_user(email="perm@example.com", password=None, is_active=True)
+        self.perm = Permission.objects.get(codename="view_group")
+        self.group = Group.objects.create(name="viewers")
+        self.group.permissions.add(self.perm)
+
+    def fresh_user(self):
+        return UserAccount.objects.get(pk=self.user.pk)
+
+    def test_permission_set_is_reused_across_requests(self):
+        self.assertFalse(self.fresh_user().has_perm("auth.view_group"))
+
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertFalse(user.has_perm("auth.view_group"))
+
+    def test_group_membership_change_invalidates(self):
+        self.fresh_user().has_perm("auth.view_group")
+        self.user.groups.add(self.group)
+
+        self.assertTrue(self.fresh_user().has_perm("auth.view_group"))
+
+    def test_group_permission_change_invalidates(self):
+        self.user.groups.add(self.group)
+        self.assertTrue(self.fresh_user().has_perm("auth.view_group"))
+
+        self.group.permissions.remove(self.perm)
+
+        self.assertFalse(self.fresh_user().has_perm("auth.view_group"))
+
+    @override_settings(AUTH_PERMISSIONS_CLAIM="perms")
+    def test_token_claim_used_until_permissions_change(self):
+        self.user.groups.add(self.group)
+        access = CustomRefreshToken.for_user(self.user).access_token
+        self.assertEqual(access["perms"], ["auth.view_group"])
+
+        # as seen by a process that saw no permission changes since issuing
+        permission_cache.clear()
+        permission_cache._cleared_at = 0.0
+        user = CustomJWTAuthentication().get_user(access)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("auth.view_group"))
+
+        self.group.permissions.remove(self.perm)
+        user = CustomJWTAuthentication().get_user(access)
+        self.assertFalse(user.has_perm("auth.view_group"))
+
+    @override_settings(AUTH_PERMISSIONS_CLAIM="perms")
+    def test_refreshed_access_token_has_current_permissions(self):
+        self.user.groups.add(self.group)
+        refresh = CustomRefreshToken.for_user(self.user)
+        self.assertNotIn("perms", refresh)
+
+        self.user.groups.remove(self.group)
+        access = CustomRefreshToken(str(refresh)).access_token
+
+        self.assertEqual(access["perms"], [])
+        self.assertFalse(CustomJWTAuthentication().get_user(access).has_perm("auth.view_group"))
+
+    @override_settings(AUTH_PERMISSIONS_CLAIM="perms")
+    def test_changes_are_seen_by_other_workers(self):
+        self.user.groups.add(self.group)
+        access = CustomRefreshToken.for_user(self.user).access_token
+
+        # a worker with a fresh process-local view, sharing the cache tier
+        with mock.patch.object(permission_cache, "backend", "default"):
+            self.group.permissions.remove(self.perm)
+            with mock.patch.multiple(permission_cache, _changed={}, _cleared_at=0.0):
+                self.assertFalse(permission_cache.is_fresh(self.user.pk, access["iat"]))
+
+
+@override_settings(AUTH_LOGIN_RETURNS_USER=True)
+class LoginUserPayloadTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user(
+            email="me@example.com", password="secret-pass-123",
+            first_name="Me", last_name="User", is_active=True,
+        )
+        bucket_store.clear()
+
+    def test_login_embeds_current_user(self):
+        login = self.client.post("/api/jwt/create/", {"email": "me@example.com", "password": "secret-pass-123"})
+        me = self.client.get("/api/users/me/")
+
+        self.assertEqual(login.status_code, 200)
+        self.assertEqual(login.data["user"], me.data)
+        self.assertIn(settings.AUTH_COOKIE_ACCESS_KEY, login.cookies)
+
+    @override_settings(AUTH_LOGIN_RETURNS_USER=False)
+    def test_disabled_by_default(self):
+        login = self.client.post("/api/jwt/create/", {"email": "me@example.com", "password": "secret-pass-123"})
+
+        self.assertNotIn("user", login.data)
+
+
+@override_settings(AUTH_ACCESS_RENEWAL=True)
+class AccessRenewalTests(TestCase):
+    def setUp(self):
+        UserAccount.objects.create_user(email="renew@example.com", password="secret-pass-123", is_active=True)
+        token_cache.clear()
+        bucket_store.clear()
+        self.client.post("/api/jwt/create/", {"email": "renew@example.com", "password": "secret-pass-123"})
+        self.access = self.client.cookies[settings.AUTH_COOKIE_ACCESS_KEY].value
+
+    def test_fresh_access_cookie_is_left_alone(self):
+        response = self.client.get("/api/users/me/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.AUTH_COOKIE_ACCESS_KEY, response.cookies)
+
+    @override_settings(AUTH_ACCESS_RENEW_WITHIN=10 ** 6)
+    def test_expiring_access_cookie_is_renewed(self):
+        response = self.client.get("/api/users/me/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.cookies[settings.AUTH_COOKIE_ACCESS_KEY].value, self.access)
+
+    def test_missing_access_cookie_is_renewed_from_refresh_cookie(self):
+        del self.client.cookies[settings.AUTH_COOKIE_ACCESS_KEY]
+
+        response = self.client.get("/api/users/me/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(settings.AUTH_COOKIE_ACCESS_KEY, response.cookies)
+
+    def test_logout_cookie_deletion_wins(self):
+        del self.client.cookies[settings.AUTH_COOKIE_ACCESS_KEY]
+
+        response = self.client.post("/api/logout/")
+
+        self.assertEqual(response.cookies[settings.AUTH_COOKIE_ACCESS_KEY].value, "")
+
+    @override_settings(AUTH_ACCESS_RENEWAL=False)
+    def test_disabled_without_setting(self):
+        del self.client.cookies[settings.AUTH_COOKIE_ACCESS_KEY]
+
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 401)
+
+
+class TokenFamilyTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(token_families, "alias", "default")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        bucket_store.clear()
+
+        UserAccount.objects.create_user(email="fam@example.com", password="secret-pass-123", is_active=True)
+        self.client.post("/api/jwt/create/", {"email": "fam@example.com", "password": "secret-pass-123"})
+
+    def refresh(self, token=None):
+        if token is not None:
+            self.client.cookies[settings.AUTH_COOKIE_REFRESH_KEY] = token
+        return self.client.post("/api/jwt/refresh/", {}, content_type="application/json")
+
+    def test_rotation_writes_no_token_rows(self):
+        outstanding = OutstandingToken.objects.count()
+
+        first = self.refresh()
+        second = self.refresh()
+
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertNotEqual(first.data["refresh"], second.data["refresh"])
+        self.assertEqual(OutstandingToken.objects.count(), outstanding)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    def test_reuse_revokes_family(self):
+        old = self.client.cookies[settings.AUTH_COOKIE_REFRESH_KEY].value
+        new = self.refresh().data["refresh"]
+
+        self.assertEqual(self.refresh(old).status_code, 401)
+        self.assertEqual(self.refresh(new).status_code, 401)
+        self.assertTrue(TokenFamily.objects.get().revoked)
+
+    def test_family_restored_from_snapshot(self):
+        self.refresh()
+        self.assertEqual(token_families.snapshot(), 1)
+        self.assertEqual(TokenFamily.objects.get().generation, 1)
+
+        cache.clear()
+
+        self.assertEqual(self.refresh().status_code, 200)
+
+    async def test_async_refresh_rotates_family(self):
+        old = self.client.cookies[settings.AUTH_COOKIE_REFRESH_KEY].value
+
+        async def refresh(token):
+            request = AsyncRequestFactory().post("/api/jwt/refresh/", {}, content_type="application/json")
+            request.COOKIES[settings.AUTH_COOKIE_REFRESH_KEY] = token
+            return await AsyncCustomTokenRefreshView.as_view()(request)
+
+        response = await refresh(old)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(settings.AUTH_COOKIE_REFRESH_KEY, response.cookies)
+        self.assertEqual((await refresh(old)).status_code, 401)
+
+    def test_logout_revokes_family(self):
+        self.client.post("/api/logout/")
+
+        self.assertTrue(TokenFamily.objects.get().revoked)
+
+    @override_settings(AUTH_ACCESS_RENEWAL=True)
+    def test_revoked_family_does_not_renew(self):
+        refresh = self.client.cookies[settings.AUTH_COOKIE_REFRESH_KEY].value
+        self.client.post("/api/logout/")
+        self.client.cookies[settings.AUTH_COOKIE_REFRESH_KEY] = refresh
+
+        response = self.client.get("/api/users/me/")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn(settings.AUTH_COOKIE_ACCESS_KEY, response.cookies)
+
+    def test_replayed_token_does_not_verify(self):
+        old = self.client.cookies[settings.AUTH_COOKIE_REFRESH_KEY].value
+        new = self.refresh().data["refresh"]
+
+        def verify(token):
+            return self.client.post("/api/jwt/verify/", {"token": token}, content_type="application/json")
+
+        # superseded by rotation, then the family is revoked by the replay
+        self.client.cookies[settings.AUTH_COOKIE_REFRESH_KEY] = ""
+        self.assertEqual(verify(old).status_code, 400)
+        self.assertEqual(verify(new).status_code, 200)
+        self.refresh(old)
+        self.client.cookies[settings.AUTH_COOKIE_REFRESH_KEY] = ""
+        self.assertEqual(verify(new).status_code, 400)
+
+        response = TokenBatchVerifyView.as_view()(
+            APIRequestFactory().post("/api/jwt/verify/batch/", {"tokens": [old, new]}, format="json")
+        )
+        self.assertEqual([result["valid"] for result in response.data["results"]], [False, False])
+
+
+class BenchAuthTests(SimpleTestCase):
+    def test_bench_runs_without_errors(self):
+        output = os.path.join(tempfile.mkdtemp(), "bench.json")
+
+        # more logins from one address than the login_ip rate allows
+        subprocess.run(
+            [
+                sys.executable, "manage.py", "bench_auth",
+                "--users", "5", "--requests", "40", "--concurrency", "4", "--output", output,
+            ],
+            cwd=settings.BASE_DIR, check=True, capture_output=True, timeout=120,
+        )
+
+        with open(output) as f:
+            endpoints = json.load(f)["endpoints"]
+        self.assertEqual({name: stats["errors"] for name, stats in endpoints.items() if stats["errors"]}, {})
+
+
+class TunedSQLiteTests(SimpleTestCase):
+    alias = "tuned_sqlite"
+    threads = 8
+    writes = 25
+
+    def run_writers(self, wrapper_class, options):
+        path = os.path.join(tempfile.mkdtemp(), "db.sqlite3")
+        settings_dict = {**connection.settings_dict, "NAME": path, "OPTIONS": options}
+        errors = []
+
+        setup = wrapper_class(settings_dict, self.alias)
+        with setup.cursor() as cursor:
+            cursor.execute("CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER)")
+        setup.close()
+
+        def writer():
+            # connections is thread-local, so each writer gets its own
+            db = connections[self.alias] = wrapper_class(settings_dict, self.alias)
+            try:
+                for _ in range(self.writes):
+                    try:
+                        # read, then write: the pattern behind most auth writes
+                        with transaction.atomic(using=self.alias), db.cursor() as cursor:
+                            cursor.execute("SELECT COUNT(*) FROM counter")
+                            cursor.execute("INSERT INTO counter (value) VALUES (%s)", [cursor.fetchone()[0]])
+                    except OperationalError:
+                        errors.append(1)
+            finally:
+                db.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=writer) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        check = wrapper_class(settings_dict, self.alias)
+        with check.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM counter")
+            written = cursor.fetchone()[0]
+        check.close()
+
+        return written, len(errors), written / elapsed
+
+    def test_tuned_profile_serializes_writers(self):
+        written, errors, _ = self.run_writers(TunedDatabaseWrapper, settings.SQLITE_TUNED_OPTIONS)
+
+        self.assertEqual(errors, 0)
+        self.assertEqual(written, self.threads * self.writes)
+
+    def test_tuned_profile_beats_default_write_throughput(self):
+        default = self.run_writers(SQLiteDatabaseWrapper, {"timeout": 5})
+        tuned = self.run_writers(TunedDatabaseWrapper, settings.SQLITE_TUNED_OPTIONS)
+
+        self.assertGreaterEqual(tuned[0], default[0])
+        self.assertGreater(tuned[2], default[2])
+
+
+@override_settings(ROOT_URLCONF="full_auth.urls_api")
+class ApiProfileTests(TestCase):
+    def test_user_routes_match_djosers_router(self):
+        from django.urls import resolve
+
+        for path in ["/api/users/", "/api/users/me/", "/api/users/activation/",
+                     "/api/users/reset_email_confirm/", "/api/users/set_email/", "/api/users/7/"]:
+            lazy = resolve(path)
+            routed = resolve(path.removeprefix("/api"), urlconf="djoser.urls")
+            # as_view() adds "head" to the actions of views that served a GET
+            self.assertEqual(
+                {**lazy.func.actions, "head": None}, {**routed.func.actions, "head": None}, path,
+            )
+            self.assertEqual(lazy.kwargs, routed.kwargs, path)
+
+    def test_lazy_views_serve_requests(self):
+        response = self.client.post("/api/users/", {
+            "email": "lazy@example.com", "first_name": "L", "last_name": "Z",
+            "password": "Secret-pass-123!", "re_password": "Secret-pass-123!",
+        })
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.post("/api/jwt/verify/", {"token": "invalid"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_profile_leaves_out_html_apps(self):
+        from full_auth import settings_api
+
+        self.assertNotIn("django.contrib.admin", settings_api.INSTALLED_APPS)
+        self.assertNotIn("django.contrib.sessions.middleware.SessionMiddleware", settings_api.MIDDLEWARE)
+        self.assertIn("users", settings_api.INSTALLED_APPS)
+
+    def test_prewarm(self):
+        from .prewarm import prewarm
+
+        self.assertEqual(set(prewarm()), {"urls", "tokens", "hashers", "caches", "pool"})
+        self.assertNotIn("pool", prewarm(start_pool=False))
+
+    def test_asgi_entry_point_closes_connections(self):
+        env = {k: v for k, v in os.environ.items() if k != "DB_CONN_MAX_AGE"}
+        probe = (
+            "import full_auth.asgi; from django.conf import settings; "
+            "print(settings.DATABASES['default']['CONN_MAX_AGE'])"
+        )
+
+        output = subprocess.run(
+            [sys.executable, "-c", probe], cwd=settings.BASE_DIR, env=env,
+            check=True, capture_output=True, text=True,
+        ).stdout
+
+        self.assertEqual(output.strip(), "0")
+
+
+class ApiDispatchTests(TestCase):
+    def test_api_requests_skip_the_full_chain(self):
+        response = self.client.post("/api/jwt/verify/", {"token": "invalid"})
+
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn("X-Frame-Options", response.headers)
+        self.assertFalse(hasattr(response.wsgi_request, "session"))
+
+        response = self.client.get("/admin/login/")
+        self.assertEqual(response.headers["X-Frame-Options"], "DENY")
+        self.assertTrue(hasattr(response.wsgi_request, "session"))
+
+    @override_settings(AUTH_API_MIDDLEWARE=None)
+    def test_disabled_dispatcher_keeps_one_chain(self):
+        response = self.client.post("/api/jwt/verify/", {"token": "invalid"})
+
+        self.assertEqual(response.headers["X-Frame-Options"], "DENY")
+
+    def test_cookie_sessions_need_the_csrf_token(self):
+        from django.test import Client
+
+        UserAccount.objects.create_user(
+            email="csrf@example.com", password="secret-pass-123",
+            first_name="C", last_name="S", is_active=True,
+        )
+        client = Client(enforce_csrf_checks=True)
+        login = client.post("/api/jwt/create/", {"email": "csrf@example.com", "password": "secret-pass-123"})
+        csrf_token = login.cookies[settings.CSRF_COOKIE_NAME].value
+
+        self.assertEqual(client.post("/api/logout/").status_code, 403)
+
+        bearer = f"Bearer {login.data['access']}"
+        self.assertEqual(client.post("/api/logout/", HTTP_AUTHORIZATION=bearer).status_code, 204)
+
+        client.post("/api/jwt/create/", {"email": "csrf@example.com", "password": "secret-pass-123"})
+        self.assertEqual(client.post("/api/logout/", HTTP_X_CSRFTOKEN=csrf_token).status_code, 204)
+
+        client.post("/api/jwt/create/", {"email": "csrf@example.com", "password": "secret-pass-123"})
+        self.assertEqual(client.post("/api/logout/", HTTP_ORIGIN="https://evil.example").status_code, 403)
+        self.assertEqual(client.post("/api/logout/", HTTP_ORIGIN=settings.CORS_ALLOWED_ORIGINS[0]).status_code, 204)
+
+    @override_settings(AUTH_COOKIE_CSRF=False)
+    def test_csrf_check_can_be_turned_off(self):
+        from django.test import Client
+
+        UserAccount.objects.create_user(email="nocsrf@example.com", password="secret-pass-123", is_active=True)
+        client = Client(enforce_csrf_checks=True)
+        client.post("/api/jwt/create/", {"email": "nocsrf@example.com", "password": "secret-pass-123"})
+
+        self.assertEqual(client.post("/api/logout/").status_code, 204)
+
+
+@skipUnless(hasattr(os, "fork"), "serve_auth forks its workers")
+class ServeAuthTests(SimpleTestCase):
+    def test_serves_reports_and_stops(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+
+        db_dir = tempfile.mkdtemp()
+        server = subprocess.Popen(
+            [sys.executable, "manage.py", "serve_auth", f"127.0.0.1:{port}", "--workers", "2"],
+            cwd=settings.BASE_DIR, env={**os.environ, "DB_NAME": os.path.join(db_dir, "db.sqlite3")},
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        try:
+            self.assertIn("2/2 workers serving", server.stdout.readline())
+
+            for _ in range(3):
+                client = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                client.request("POST", "/api/jwt/verify/", body="token=invalid",
+                               headers={"Content-Type": "application/x-www-form-urlencoded"})
+                self.assertEqual(client.getresponse().status, 401)
+                client.close()
+
+            server.send_signal(signal.SIGTERM)
+            output, _ = server.communicate(timeout=30)
+        finally:
+            if server.poll() is None:
+                server.kill()
+                server.wait()
+
+        self.assertEqual(server.returncode, 0)
+        self.assertIn("total: 3 requests", output)
+
+
+class AuditLogTests(TestCase):
+    def setUp(self):
+        UserAccount.objects.create_user(
+            email="audit@example.com", password="secret-pass-123",
+            first_name="A", last_name="U", is_active=True,
+        )
+        bucket_store.clear()
+
+    def test_auth_events_are_recorded(self):
+        with mock.patch.multiple(audit_log, sink_name="db", flush_interval=3600, _pid=None):
+            self.client.post("/api/jwt/create/", {"email": "audit@example.com", "password": "wrong-pass"})
+            self.client.post("/api/jwt/create/", {"email": "audit@example.com", "password": "secret-pass-123"})
+            self.client.post("/api/jwt/refresh/", {}, content_type="application/json")
+            self.client.post("/api/logout/")
+            self.client.cookies[settings.AUTH_COOKIE_ACCESS_KEY] = "garbage"
+            self.client.get("/api/users/me/")
+            audit_log.flush()
+
+        user = UserAccount.objects.get(email="audit@example.com")
+        self.assertEqual(
+            list(AuditEvent.objects.order_by("id").values_list("event", "outcome", "user_id")),
+            [
+                ("login", "failure", None),
+                ("login", "success", user.pk),
+                ("refresh", "success", user.pk),
+                ("logout", "success", user.pk),
+                ("authenticate", "failure", None),
+            ],
+        )
+        failed_login = AuditEvent.objects.order_by("id").first()
+        self.assertEqual(failed_login.identifier, "audit@example.com")
+        self.assertEqual(failed_login.code, "no_active_account")
+
+    def test_full_buffer_drops_instead_of_blocking(self):
+        log = AuditLog(sink="file", capacity=2, flush_interval=3600)
+
+        with override_settings(AUTH_AUDIT_FILE=os.path.join(tempfile.mkdtemp(), "audit.ndjson")):
+            for i in range(3):
+                log.add({"event": "login", "n": i})
+
+        self.assertEqual(log.stats()["dropped"], 1)
+        self.assertEqual(log.flush(), 2)
+
+    def test_file_sink_rotates(self):
+        path = os.path.join(tempfile.mkdtemp(), "audit.ndjson")
+        sink = FileSink(path, max_bytes=100, backups=2)
+
+        for i in range(5):
+            sink.write([{"event": "login", "n": i}, {"event": "logout", "n": i}])
+
+        self.assertTrue(os.path.exists(f"{path}.2"))
+        self.assertFalse(os.path.exists(f"{path}.3"))
+        with open(path) as f:
+            self.assertEqual([json.loads(line)["n"] for line in f], [4, 4])
+
+
+class TokenEpochTests(TestCase):
+    def setUp(self):
+        # epochs are opt-in; the tests run them on the LocMem default cache
+        patcher = mock.patch.object(token_epochs, "alias", "default")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # user ids are reused between tests, their cached epochs must not be
+        cache.clear()
+        self.addCleanup(cache.clear)
+        token_cache.clear()
+        user_cache.clear()
+        bucket_store.clear()
+
+        self.user = UserAccount.objects.create_user(
+            email="epoch@example.com", password="secret-pass-123", is_active=True,
+        )
+        self.client.post("/api/jwt/create/", {"email": "epoch@example.com", "password": "secret-pass-123"})
+
+    def test_logout_all_revokes_every_session(self):
+        other = self.client_class()
+        other.post("/api/jwt/create/", {"email": "epoch@example.com", "password": "secret-pass-123"})
+        refresh = other.cookies[settings.AUTH_COOKIE_REFRESH_KEY].value
+
+        self.assertEqual(self.client.post("/api/logout/all/").status_code, 204)
+
+        self.assertEqual(other.get("/api/users/me/").status_code, 401)
+        self.assertEqual(other.post("/api/jwt/refresh/", {}, content_type="application/json").status_code, 401)
+        self.assertEqual(self.client.post("/api/jwt/verify/", {"token": refresh}, content_type="application/json").status_code, 400)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+        other.post("/api/jwt/create/", {"email": "epoch@example.com", "password": "secret-pass-123"})
+        self.assertEqual(other.get("/api/users/me/").status_code, 200)
+
+    def test_check_is_one_cache_lookup(self):
+        access = self.client.cookies[settings.AUTH_COOKIE_ACCESS_KEY].value
+        self.assertEqual(AccessToken(access)[EPOCH_CLAIM], 0)
+        self.client.get("/api/users/me/")
+
+        with self.assertNumQueries(0):
+            self.assertTrue(token_epochs.is_current(AccessToken(access)))
+
+    def test_bump_survives_cache_loss(self):
+        access = AccessToken(self.client.cookies[settings.AUTH_COOKIE_ACCESS_KEY].value)
+        token_epochs.bump(self.user.pk)
+        cache.clear()
+
+        self.assertFalse(token_epochs.is_current(access))
+        self.assertEqual(UserAccount.objects.get(pk=self.user.pk).token_epoch, 1)
+
+    def test_logout_all_needs_authentication(self):
+        self.assertEqual(self.client_class().post("/api/logout/all/").status_code, 401)
+
+    async def test_async_logout_all(self):
+        access = self.client.cookies[settings.AUTH_COOKIE_ACCESS_KEY].value
+        request = AsyncRequestFactory().post(
+            "/api/logout/all/", headers={"Origin": settings.CORS_ALLOWED_ORIGINS[0]},
+        )
+        request.COOKIES[settings.AUTH_COOKIE_ACCESS_KEY] = access
+
+        response = await AsyncLogoutAllView.as_view()(request)
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(await token_epochs.ais_current(AccessToken(access)))
+
+    def test_logout_all_without_epochs_blacklists_refresh_tokens(self):
+        other = self.client_class()
+        other.post("/api/jwt/create/", {"email": "epoch@example.com", "password": "secret-pass-123"})
+
+        with mock.patch.object(token_epochs, "alias", None):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.post("/api/logout/all/").status_code, 204)
+            self.assertEqual(other.post("/api/jwt/refresh/", {}, content_type="application/json").status_code, 401)
+
+        self.assertFalse(
+            OutstandingToken.objects.filter(user=self.user, blacklistedtoken__isnull=True).exists()
+        )
+
+    def test_locmem_epochs_cache_fails_the_system_check(self):
+        with override_settings(AUTH_TOKEN_EPOCHS_CACHE="default"):
+            errors = check_epochs_cache(None)
+
+        self.assertEqual([error.id for error in errors], ["users.E001"])
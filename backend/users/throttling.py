@@ -0,0 +1,203 @@
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import Throttled
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+
+def parse_rate(rate):
+    """
+    Parses "<count>/<period>" (e.g. "5/min") into (capacity, refill per second).
+    """
+    count, period = rate.split("/")
+    return int(count), int(count) / PERIODS[period]
+
+
+class TokenBucketStore:
+    """
+    In-process token buckets, split over shards with their own lock so that
+    concurrent requests for different keys rarely contend.
+    """
+
+    def __init__(self, shards=16, max_keys_per_shard=10_000):
+        self.max_keys_per_shard = max_keys_per_shard
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+
+    def _shard(self, key):
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    def consume(self, key, capacity, refill_rate):
+        """
+        Takes one token from the bucket for key. Returns 0 if allowed,
+        otherwise the seconds until a token is available.
+        """
+        buckets, lock = self._shard(key)
+        now = time.monotonic()
+
+        with lock:
+            tokens, updated = buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+
+            if tokens < 1:
+                buckets[key] = (tokens, now)
+                return (1 - tokens) / refill_rate
+
+            buckets[key] = (tokens - 1, now)
+
+            if len(buckets) > self.max_keys_per_shard:
+                self._evict(buckets, now, capacity, refill_rate)
+
+            return 0
+
+    def _evict(self, buckets, now, capacity, refill_rate):
+        # buckets that have refilled completely carry no state worth keeping
+        for key, (tokens, updated) in list(buckets.items()):
+            if tokens + (now - updated) * refill_rate >= capacity:
+                del buckets[key]
+
+    def clear(self):
+        for buckets, lock in self._shards:
+            with lock:
+                buckets.clear()
+
+
+bucket_store = TokenBucketStore(shards=getattr(settings, "AUTH_THROTTLE_SHARDS", 16))
+
+
+def consume_shared(key, capacity, period):
+    """
+    Fixed-window counter in the shared cache (AUTH_THROTTLE_CACHE), so limits
+    also hold across workers. Returns 0 if allowed, else seconds to wait.
+    """
+    alias = getattr(settings, "AUTH_THROTTLE_CACHE", None)
+    if alias is None:
+        return 0
+
+    cache = caches[alias]
+    window = int(time.time() // period)
+    cache_key = f"throttle:{key}:{window}"
+
+    cache.add(cache_key, 0, period)
+    try:
+        count = cache.incr(cache_key)
+    except ValueError:
+        # expired between add() and incr()
+        cache.set(cache_key, 1, period)
+        count = 1
+
+    if count > capacity:
+        return (window + 1) * period - time.time()
+
+    return 0
+
+
+def get_scope(view):
+    """
+    Login views set throttle_scope = "login"; djoser's reset_password action
+    is recognised by name since its viewset is not ours.
+    """
+    scope = getattr(view, "throttle_scope", None)
+
+    if scope is None and getattr(view, "action", None) == "reset_password":
+        scope = "password_reset"
+
+    return scope
+
+
+def check_rate(scope, kind, ident):
+    """
+    Returns 0 if the attempt is allowed, otherwise the seconds to wait.
+    """
+    rate = settings.AUTH_THROTTLE_RATES.get(f"{scope}_{kind}")
+    if rate is None or not ident:
+        return 0
+
+    capacity, refill_rate = parse_rate(rate)
+    key = f"{scope}:{kind}:{ident}"
+
+    wait = bucket_store.consume(key, capacity, refill_rate)
+    if wait:
+        return wait
+
+    return consume_shared(key, capacity, capacity / refill_rate)
+
+
+def get_email(data):
+    email = data.get("email") if hasattr(data, "get") else None
+
+    if not isinstance(email, str):
+        return None
+
+    # same normalisation as UserAccountManager._create_user
+    return email.strip().lower()
+
+
+class AuthThrottle(BaseThrottle):
+    """
+    Throttles login and password-reset attempts per client IP or per email,
+    before the view runs any query or password hash. Views without an auth
+    throttle scope are never throttled.
+    """
+
+    kind = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = get_scope(view)
+        if scope is None:
+            return True
+
+        self._wait = check_rate(scope, self.kind, self.get_key(request))
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class AuthIPThrottle(AuthThrottle):
+    kind = "ip"
+
+    def get_ident(self, request):
+        """
+        The client address. X-Forwarded-For is only trusted once NUM_PROXIES
+        says how many proxies set it; otherwise any client could pick its
+        own key by sending one.
+        """
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get("REMOTE_ADDR")
+
+        return super().get_ident(request)
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class AuthEmailThrottle(AuthThrottle):
+    kind = "email"
+
+    def get_key(self, request):
+        return get_email(request.data)
+
+
+def check_login_throttles(request, data):
+    """
+    Same checks as the throttle classes, for the async login view. Raises
+    Throttled.
+    """
+    for kind, ident in (
+        ("ip", AuthIPThrottle().get_ident(request)),
+        ("email", get_email(data)),
+    ):
+        wait = check_rate("login", kind, ident)
+        if wait:
+            raise Throttled(wait, _("Too many login attempts."))
@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of validated access tokens, keyed by a hash of the raw
+    token. Entries expire at the token's "exp" claim.
+
+    Only signature and expiry checks are cached: revocation (token epochs)
+    is checked on every request, cached or not, so nothing needs evicting
+    when a user's tokens are revoked.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> (validated_token, exp)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(raw_token):
+        if isinstance(raw_token, str):
+            raw_token = raw_token.encode()
+
+        return hashlib.sha256(raw_token).hexdigest()
+
+    def get(self, raw_token):
+        if self.maxsize <= 0:
+            return None
+
+        key = self.make_key(raw_token)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            validated_token, exp = entry
+
+            if exp <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return validated_token
+
+    def set(self, raw_token, validated_token):
+        if self.maxsize <= 0:
+            return
+
+        exp = validated_token.get("exp")
+        if exp is None or exp <= time.time():
+            return
+
+        key = self.make_key(raw_token)
+
+        with self._lock:
+            self._entries[key] = (validated_token, exp)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, raw_token):
+        """
+        Drops a raw token from the cache, e.g. on logout.
+        """
+        with self._lock:
+            self._entries.pop(self.make_key(raw_token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+
+token_cache = TokenCache(getattr(settings, "AUTH_TOKEN_CACHE_SIZE", 1024))
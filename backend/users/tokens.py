@@ -0,0 +1,152 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .epochs import token_epochs
+from .families import token_families
+from .permission_cache import permission_cache
+from .revocation import revocation_index
+
+
+def _users(user_id):
+    return get_user_model()._default_manager.filter(**{api_settings.USER_ID_FIELD: user_id})
+
+
+class CustomRefreshToken(RefreshToken):
+    """
+    The permissions claim (AUTH_PERMISSIONS_CLAIM) only goes on access
+    tokens, computed afresh for each one: a refresh token outlives any
+    permission set it could carry.
+    """
+
+    _user = None
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token_epochs.stamp(token, user)
+        # saves a query for the login's access token
+        token._user = user
+
+        if token_families.enabled:
+            token_families.start(token, user.pk)
+
+        return token
+
+    def _access_token(self, perms):
+        access = RefreshToken.access_token.fget(self)
+        claim = getattr(settings, "AUTH_PERMISSIONS_CLAIM", None)
+
+        if claim:
+            # never carried over from refresh tokens issued before the claim moved
+            access.payload.pop(claim, None)
+            if perms is not None:
+                access[claim] = sorted(perms)
+
+        return access
+
+    def _cached_permissions(self):
+        if self._user is not None:
+            return None
+        return permission_cache.get(self.payload.get(api_settings.USER_ID_CLAIM))
+
+    @property
+    def access_token(self):
+        perms = None
+
+        if getattr(settings, "AUTH_PERMISSIONS_CLAIM", None):
+            perms = self._cached_permissions()
+            if perms is None:
+                user = self._user or _users(self.payload.get(api_settings.USER_ID_CLAIM)).first()
+                perms = user.get_all_permissions() if user is not None else None
+
+        return self._access_token(perms)
+
+    def check_blacklist(self):
+        """
+        Checks the jti against the in-memory revocation index, which only
+        queries BlacklistedToken on a Bloom filter hit.
+        """
+        if revocation_index.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+
+class AsyncRefreshToken(CustomRefreshToken):
+    """
+    RefreshToken whose blacklist bookkeeping uses the async ORM, for the views
+    in users.async_views. Constructing one only checks signature, expiry and
+    type; callers must await acheck_blacklist() themselves.
+    """
+
+    def verify(self, *args, **kwargs):
+        # skip BlacklistMixin.verify, which queries the blacklist synchronously
+        Token.verify(self, *args, **kwargs)
+
+    async def acheck_blacklist(self):
+        if await revocation_index.ais_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    async def aget_user(self):
+        User = get_user_model()
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+
+        try:
+            return await User.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            return None
+
+    async def aaccess_token(self):
+        """
+        access_token for async code, which must not touch the sync ORM.
+        """
+        perms = None
+
+        if getattr(settings, "AUTH_PERMISSIONS_CLAIM", None):
+            perms = self._cached_permissions()
+            if perms is None:
+                user = self._user or await self.aget_user()
+                perms = await user.aget_all_permissions() if user is not None else None
+
+        return self._access_token(perms)
+
+    async def aoutstand(self):
+        return await OutstandingToken.objects.aget_or_create(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            defaults={
+                "user": await self.aget_user(),
+                "created_at": self.current_time,
+                "token": str(self),
+                "expires_at": datetime_from_epoch(self.payload["exp"]),
+            },
+        )
+
+    async def ablacklist(self):
+        token, _ = await self.aoutstand()
+
+        return await BlacklistedToken.objects.aget_or_create(token=token)
+
+    @classmethod
+    async def afor_user(cls, user):
+        # Token.for_user builds the claims without the synchronous
+        # OutstandingToken insert done by BlacklistMixin.for_user
+        token = Token.for_user.__func__(cls, user)
+        token_epochs.stamp(token, user)
+        token._user = user
+
+        if token_families.enabled:
+            await token_families.astart(token, user.pk)
+
+        await OutstandingToken.objects.acreate(
+            user=user,
+            jti=token[api_settings.JTI_CLAIM],
+            token=str(token),
+            created_at=token.current_time,
+            expires_at=datetime_from_epoch(token["exp"]),
+        )
+
+        return token
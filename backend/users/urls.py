@@ -1,15 +1,46 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     # CustomProviderAuthView,
     CustomTokenObtainPairView,
     CustomTokenRefreshView,
     CustomTokenVerifyView,
-    LogoutView
+    TokenBatchVerifyView,
+    LogoutView,
+    LogoutAllView,
+    UserApproveView,
+    metrics_view
 )
 
 urlpatterns = [
     path('jwt/create/', CustomTokenObtainPairView.as_view()),
     path('jwt/refresh/', CustomTokenRefreshView.as_view()),
     path('jwt/verify/', CustomTokenVerifyView.as_view()),
+    path('jwt/verify/batch/', TokenBatchVerifyView.as_view()),
     path('logout/', LogoutView.as_view()),
-]
\ No newline at end of file
+    path('logout/all/', LogoutAllView.as_view()),
+    path('approvals/', UserApproveView.as_view()),
+]
+
+if settings.AUTH_ASYNC_VIEWS:
+    # async-native variants for ASGI deployments, same paths
+    from .async_views import (
+        AsyncCustomTokenObtainPairView,
+        AsyncCustomTokenRefreshView,
+        AsyncCustomTokenVerifyView,
+        AsyncLogoutView,
+        AsyncLogoutAllView
+    )
+
+    urlpatterns = [
+        path('jwt/create/', AsyncCustomTokenObtainPairView.as_view()),
+        path('jwt/refresh/', AsyncCustomTokenRefreshView.as_view()),
+        path('jwt/verify/', AsyncCustomTokenVerifyView.as_view()),
+        path('jwt/verify/batch/', TokenBatchVerifyView.as_view()),
+        path('logout/', AsyncLogoutView.as_view()),
+        path('logout/all/', AsyncLogoutAllView.as_view()),
+        path('approvals/', UserApproveView.as_view()),
+    ]
+
+if settings.AUTH_TIMING_ENABLED:
+    urlpatterns.append(path('metrics/', metrics_view))
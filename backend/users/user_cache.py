@@ -0,0 +1,157 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class UserCache:
+    """
+    Two-tier cache of user snapshots used by the authentication hot path.
+
+    The first tier is an in-process LRU with a short TTL. The optional second
+    tier is a Django cache backend shared between workers. Both tiers are
+    invalidated by the signal handlers in users.signals.
+
+    Those handlers only reach the in-process tier of the worker that saved
+    the user. With a shared tier, invalidate() also leaves a per-user stamp
+    there, and every in-process hit is checked against it (one shared get),
+    so other workers drop their copy on their next lookup. Without one,
+    other workers may serve the old snapshot until it expires (ttl).
+    """
+
+    key_prefix = "users:snapshot:"
+    generation_key = "users:snapshot:generation"
+    stamp_key_prefix = "users:snapshot:stamp:"
+
+    def __init__(self, maxsize=1024, ttl=60, backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # user_id -> (user, expires_at, version)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def _shared(self):
+        if self.backend is None:
+            return None
+
+        return caches[self.backend]
+
+    def _version(self, shared, user_id):
+        """
+        (generation, stamp) of user_id in the shared tier; an in-process
+        entry filled under another version is stale.
+        """
+        if shared is None:
+            return None
+
+        stamp_key = f"{self.stamp_key_prefix}{user_id}"
+        values = shared.get_many([self.generation_key, stamp_key])
+        return values.get(self.generation_key, 0), values.get(stamp_key)
+
+    def _shared_key(self, version, user_id):
+        # bumping the generation drops every shared entry at once
+        return "%s%s:%s" % (self.key_prefix, version[0], user_id)
+
+    def get(self, user_id):
+        if not self.enabled:
+            return None
+
+        user_id = str(user_id)
+        shared = self._shared()
+        version = self._version(shared, user_id)
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+
+            if entry is not None:
+                user, expires_at, entry_version = entry
+
+                if expires_at > time.monotonic() and entry_version == version:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    # hand out a copy so per-request state never leaks
+                    return copy.copy(user)
+
+                del self._entries[user_id]
+
+        user = None
+        if shared is not None:
+            user = shared.get(self._shared_key(version, user_id))
+
+        if user is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._store(user_id, user, version)
+
+        return copy.copy(user)
+
+    def set(self, user_id, user):
+        if not self.enabled:
+            return
+
+        user_id = str(user_id)
+        shared = self._shared()
+        version = self._version(shared, user_id)
+        self._store(user_id, copy.copy(user), version)
+
+        if shared is not None:
+            shared.set(self._shared_key(version, user_id), user, self.ttl)
+
+    def invalidate(self, user_id):
+        user_id = str(user_id)
+
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+        shared = self._shared()
+        if shared is not None:
+            shared.delete(self._shared_key(self._version(shared, user_id), user_id))
+            # outlives every in-process entry filled before it
+            shared.set(f"{self.stamp_key_prefix}{user_id}", time.time(), self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.incr(self.generation_key)
+            except ValueError:
+                shared.set(self.generation_key, 1, None)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def _store(self, user_id, user, version):
+        with self._lock:
+            self._entries[user_id] = (user, time.monotonic() + self.ttl, version)
+            self._entries.move_to_end(user_id)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+user_cache = UserCache(
+    maxsize=getattr(settings, "AUTH_USER_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "AUTH_USER_CACHE_TTL", 60),
+    backend=getattr(settings, "AUTH_USER_CACHE_BACKEND", None),
+)
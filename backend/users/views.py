@@ -1,50 +1,77 @@
 
 from rest_framework.response import Response
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse, HttpResponseForbidden
+from django.middleware.csrf import CsrfViewMiddleware, get_token
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 # from djoser.social.views import ProviderAuthView
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
-    TokenVerifyView
+    TokenVerifyView,
+    TokenViewBase
 )
 
+from .serializers import (
+    CustomTokenObtainPairSerializer,
+    CustomTokenRefreshSerializer,
+    CustomTokenVerifySerializer,
+    TokenBatchVerifySerializer,
+    UserApproveSerializer
+)
+from .approval import approve_users
+from .audit import audit_log, record_response
+from .epochs import revoke_all, token_epochs
+from .families import revoke_family_of, token_families
+from .hashing import hashing_pool
+from .permission_cache import permission_cache
+from .revocation import revocation_index
+from .timing import histograms, phase
+from .token_cache import token_cache
+from .user_cache import user_cache
+
 
 
-def set_cookie_internal(response, key):
+def set_cookie_internal(response, key, data=None):
     # print(type(response))
     if response is None:
         # print("Response is None")
         return None
     
+    # plain Django responses (async views) pass their payload explicitly
+    if data is None:
+        data = response.data
+
     match key:
         case settings.AUTH_COOKIE_ACCESS_KEY:
             max_age = settings.AUTH_COOKIE_ACCESS_MAX_AGE
-            token = response.data.get('access')
+            token = data.get('access')
             # print(f"Access token: {token}")
         
         case settings.AUTH_COOKIE_REFRESH_KEY:
             max_age = settings.AUTH_COOKIE_REFRESH_MAX_AGE
-            token = response.data.get('refresh')
+            token = data.get('refresh')
             # print(f"Refresh token: {token}")
             
         case _:
             raise TokenError("Unknown type of token")
             
     if token:
-        response.set_cookie(
-            key=key,
-            value=token,
-            max_age=max_age,
-            path=settings.AUTH_COOKIE_PATH,
-            secure=settings.AUTH_COOKIE_SECURE,
-            httponly=settings.AUTH_COOKIE_HTTP_ONLY,
-            samesite=settings.AUTH_COOKIE_SAMESITE
-        )
+        with phase("set_cookie"):
+            response.set_cookie(
+                key=key,
+                value=token,
+                max_age=max_age,
+                path=settings.AUTH_COOKIE_PATH,
+                secure=settings.AUTH_COOKIE_SECURE,
+                httponly=settings.AUTH_COOKIE_HTTP_ONLY,
+                samesite=settings.AUTH_COOKIE_SAMESITE
+            )
 
     return response
 
@@ -82,7 +109,65 @@ def set_cookie_internal(response, key):
 #         return response
 
 
-class CustomTokenObtainPairView(TokenObtainPairView):
+def set_csrf_cookie(request, response):
+    """
+    Hands out the token that cookie sessions echo in X-CSRFToken when
+    AUTH_COOKIE_CSRF is set; the API middleware chain has no
+    CsrfViewMiddleware to do it.
+    """
+    if getattr(settings, "AUTH_COOKIE_CSRF", True):
+        # keeps the token of an existing csrftoken cookie
+        CsrfViewMiddleware(lambda request: None).process_request(request)
+        response.set_cookie(
+            settings.CSRF_COOKIE_NAME,
+            get_token(request),
+            max_age=settings.CSRF_COOKIE_AGE,
+            domain=settings.CSRF_COOKIE_DOMAIN,
+            path=settings.CSRF_COOKIE_PATH,
+            secure=settings.CSRF_COOKIE_SECURE,
+            httponly=settings.CSRF_COOKIE_HTTPONLY,
+            samesite=settings.CSRF_COOKIE_SAMESITE,
+        )
+
+    return response
+
+
+class AuditedViewMixin:
+    """
+    Records the outcome of every request, including throttled and failed
+    ones, as an audit event named audit_event (users.audit).
+    """
+    audit_event = None
+
+    def get_serializer(self, *args, **kwargs):
+        self.serializer = super().get_serializer(*args, **kwargs)
+        return self.serializer
+
+    def get_audit_fields(self, request):
+        return {}
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        if audit_log.enabled:
+            record_response(self.audit_event, request, response, **self.get_audit_fields(request))
+
+        return response
+
+
+class CustomTokenObtainPairView(AuditedViewMixin, TokenObtainPairView):
+    serializer_class = CustomTokenObtainPairSerializer
+    throttle_scope = "login"
+    audit_event = "login"
+
+    def get_audit_fields(self, request):
+        user = getattr(getattr(self, "serializer", None), "user", None)
+        data = request.data if isinstance(request.data, dict) else {}
+        return {
+            "user_id": getattr(user, "pk", None),
+            "identifier": data.get(get_user_model().USERNAME_FIELD),
+        }
+
     def post(self, request, *args, **kwargs) -> Response:
         response = super().post(request, *args, **kwargs)
 
@@ -110,11 +195,18 @@ class CustomTokenObtainPairView(TokenObtainPairView):
             # )
             response = set_cookie_internal(response, settings.AUTH_COOKIE_ACCESS_KEY)
             response = set_cookie_internal(response, settings.AUTH_COOKIE_REFRESH_KEY)
+            response = set_csrf_cookie(request, response)
             
         return response
 
 
-class CustomTokenRefreshView(TokenRefreshView):
+class CustomTokenRefreshView(AuditedViewMixin, TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+    audit_event = "refresh"
+
+    def get_audit_fields(self, request):
+        return {"user_id": getattr(getattr(self, "serializer", None), "user_id", None)}
+
     def post(self, request, *args, **kwargs) -> Response:
         refresh_token = request.COOKIES.get(settings.AUTH_COOKIE_REFRESH_KEY)
 
@@ -136,11 +228,15 @@ class CustomTokenRefreshView(TokenRefreshView):
             #     samesite=settings.AUTH_COOKIE_SAMESITE
             # )
             response = set_cookie_internal(response, settings.AUTH_COOKIE_ACCESS_KEY)
+            # rotated refresh tokens (token families) replace the cookie
+            response = set_cookie_internal(response, settings.AUTH_COOKIE_REFRESH_KEY)
 
         return response
 
 
 class CustomTokenVerifyView(TokenVerifyView):
+    serializer_class = CustomTokenVerifySerializer
+
     def post(self, request, *args, **kwargs):
         access_token = request.COOKIES.get(settings.AUTH_COOKIE_REFRESH_KEY)
 
@@ -150,11 +246,89 @@ class CustomTokenVerifyView(TokenVerifyView):
         return super().post(request, *args, **kwargs)
 
 
-class LogoutView(APIView):
+class TokenBatchVerifyView(TokenViewBase):
+    """
+    Verifies up to AUTH_VERIFY_BATCH_MAX_TOKENS tokens in one call and reports
+    validity, expiry and user id for each, in request order.
+    """
+    serializer_class = TokenBatchVerifySerializer
+
+
+class LogoutView(AuditedViewMixin, APIView):
     permission_classes = [AllowAny]
+    audit_event = "logout"
+
+    def get_audit_fields(self, request):
+        return {"user_id": request.user.pk}
+
     def post(self, request, *args, **kwargs):
+        access_token = request.COOKIES.get(settings.AUTH_COOKIE_ACCESS_KEY)
+        if access_token:
+            token_cache.discard(access_token)
+
+        revoke_family_of(request.COOKIES.get(settings.AUTH_COOKIE_REFRESH_KEY))
+
         response: Response = Response(status=status.HTTP_204_NO_CONTENT)
         response.delete_cookie(settings.AUTH_COOKIE_ACCESS_KEY)
         response.delete_cookie(settings.AUTH_COOKIE_REFRESH_KEY)
 
-        return response
\ No newline at end of file
+        return response
+
+
+class LogoutAllView(LogoutView):
+    """
+    Logs the user out on every device: bumps their token epoch, which
+    revokes every access and refresh token issued to them so far. Without
+    epochs, their refresh tokens are revoked one by one (revoke_all).
+    """
+    permission_classes = [IsAuthenticated]
+    audit_event = "logout_all"
+
+    def post(self, request, *args, **kwargs):
+        if token_epochs.enabled:
+            token_epochs.bump(request.user.pk)
+        else:
+            revoke_all(request.user.pk)
+
+        return super().post(request, *args, **kwargs)
+
+
+class UserApproveView(APIView):
+    """
+    Activates the selected inactive users in one UPDATE and sends their
+    confirmation emails in batches.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = UserApproveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        approved = approve_users(serializer.get_queryset(get_user_model().objects.all()), request)
+
+        return Response({"approved": approved}, status=status.HTTP_200_OK)
+
+
+def metrics_view(request):
+    """
+    Phase histograms and cache/pool counters in the Prometheus text format.
+    Only served to addresses listed in INTERNAL_IPS.
+    """
+    if request.META.get("REMOTE_ADDR") not in settings.INTERNAL_IPS:
+        return HttpResponseForbidden()
+
+    lines = [histograms.render()]
+    for name, stats in (
+        ("auth_token_cache", token_cache.stats()),
+        ("auth_user_cache", user_cache.stats()),
+        ("auth_permission_cache", permission_cache.stats()),
+        ("auth_revocation_index", revocation_index.stats()),
+        ("auth_password_hashing", hashing_pool.stats()),
+        ("auth_token_families", token_families.stats()),
+        ("auth_audit", audit_log.stats()),
+        ("auth_token_epochs", token_epochs.stats()),
+    ):
+        for key, value in stats.items():
+            lines.append(f"{name}_{key} {value}\n")
+
+    return HttpResponse("".join(lines), content_type="text/plain; version=0.0.4")